@@ -0,0 +1,5 @@
+# URL change monitor engine. main.py (sheet driven) and URL_CRON_CHANGE_V5.py
+# (fixed URL list) are configurations of Pipeline.
+
+from .check import DEFAULT_STAGES, check_alarm, compare_page, fetch_page
+from .pipeline import FILES, Pipeline, save_run
@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# --------------------------------------
+# RUN BUDGET + LOCK
+# --------------------------------------
+# A run stops starting new alarms once it is out of wall clock time or
+# memory. Alarms it did not reach are flagged DEFERRED and go first on the
+# next run. The lock file keeps a late run and the next cron start from
+# writing the same files at once.
+
+# Minutes of checking per run. Cron starts a run every 15 minutes
+# (POLL_MIN_MINUTES), so this leaves time to save and alert. 0 = no limit.
+RUN_BUDGET_MINUTES = float(os.getenv("RUN_BUDGET_MINUTES", "12") or 0)
+
+# Resident memory (MB) at which the run stops starting new alarms. 0 = no limit.
+RUN_MAX_RSS_MB = float(os.getenv("RUN_MAX_RSS_MB", "1024") or 0)
+
+RUN_LOCK = "run.lock"
+
+def rss_mb():
+    # Current resident memory; None where it cannot be read
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current, in bytes on macOS and KB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+class RunBudget:
+    def __init__(self, minutes=RUN_BUDGET_MINUTES, max_rss_mb=RUN_MAX_RSS_MB):
+        self.minutes = minutes
+        self.max_rss_mb = max_rss_mb
+        self.started = time.monotonic()
+
+    def elapsed_minutes(self):
+        return (time.monotonic() - self.started) / 60.0
+
+    def seconds_left(self):
+        # None without a time limit
+        if not self.minutes:
+            return None
+        return max(0.0, self.minutes * 60.0 - (time.monotonic() - self.started))
+
+    def exhausted(self):
+        # Returns the reason once the budget is spent, else None
+        if self.minutes and self.elapsed_minutes() >= self.minutes:
+            return f"run budget {self.minutes:g} min spent"
+        if self.max_rss_mb:
+            rss = rss_mb()
+            if rss is not None and rss >= self.max_rss_mb:
+                return f"memory {rss:.0f} MB over {self.max_rss_mb:g} MB"
+        return None
+
+class RunLock:
+    # Advisory lock held for the whole run. The OS drops it when the
+    # process exits, so a killed run never leaves a stale lock behind.
+    def __init__(self, path=RUN_LOCK):
+        self.path = path
+        self._f = None
+
+    def acquire(self) -> bool:
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            try:
+                f.seek(0)
+                holder = f.read().strip()
+            except OSError:
+                holder = ""
+            f.close()
+            print(f"Another run holds {self.path} ({holder or 'unknown'}). Skipping this run.")
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(f"pid {os.getpid()} since {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.flush()
+        self._f = f
+        return True
+
+    def release(self):
+        if self._f is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+        else:
+            self._f.seek(0)
+            msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+        self._f.close()
+        self._f = None
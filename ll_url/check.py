@@ -0,0 +1,360 @@
+import os
+
+from .diffing import DIFF_PREVIEW_ROWS, line_diff, stream_diff_rows
+from .extract import normalize_content
+from .feeds import (
+    FEED_MAX_PAGES, SHEET_FEED_COLUMN, SHEET_FEED_PREFIX_COLUMN,
+    changed_entries, read_feed, resolve_feed_url,
+)
+from .fetch import fetch_text
+from .fingerprint import hamming, simhash
+from .linediff import build_line_index, text_hash
+from .rules import page_title
+
+# --------------------------------------
+# PER-ALARM CHECK
+# --------------------------------------
+# fetch_page (fetch + extract + block check) only touches its own page and
+# runs on the pipeline's fetch threads. compare_page (fingerprint + diff)
+# reads the previous snapshot and writes diff rows, so it runs in order on
+# the main thread.
+
+# "full" re-diffs whole pages, "incremental" diffs only the changed region
+# against the stored line-hash index. Per-alarm override: diff_mode column.
+DIFF_MODE = os.getenv("DIFF_MODE", "full").strip().lower() or "full"
+
+# Changes whose SimHash is at most this many bits away from the last
+# reported version are flagged MINOR_CHANGE: no diff rows, no change
+# alerts, change_count 0 (the distance is only logged). 0 disables.
+# Per-alarm override: minor_change_bits column.
+MINOR_CHANGE_BITS = int(os.getenv("MINOR_CHANGE_BITS", "0") or 0)
+
+# Diff rows are streamed to the archive. After this many rows for one
+# alarm the diff stops and a "truncated" marker row is written. 0 = no cap.
+MAX_DIFF_ROWS_PER_ALARM = int(os.getenv("MAX_DIFF_ROWS_PER_ALARM", "5000") or 0)
+
+# Stage functions a Pipeline can replace:
+#   fetch(url, stats=dict) -> raw text
+#   extract(raw_text, rules) -> normalized text
+#   fingerprint(text) -> 16 hex char SimHash
+#   diff(before, after, prev_index, mode) -> (row iterator, line hashes or None)
+DEFAULT_STAGES = {
+    "fetch": fetch_text,
+    "extract": normalize_content,
+    "fingerprint": simhash,
+    "diff": line_diff,
+}
+
+def alarm_diff_mode(opts):
+    mode = str((opts or {}).get("diff_mode") or "").strip().lower()
+    return mode if mode in ("full", "incremental") else DIFF_MODE
+
+def alarm_minor_bits(opts):
+    value = str((opts or {}).get("minor_change_bits") or "").strip()
+    try:
+        return int(value) if value != "" else MINOR_CHANGE_BITS
+    except ValueError:
+        return MINOR_CHANGE_BITS
+
+def diff_row_limit():
+    return MAX_DIFF_ROWS_PER_ALARM if MAX_DIFF_ROWS_PER_ALARM > 0 else None
+
+def fetch_page(url, rules, stages=None):
+    # Returns a page dict: normalized text, blocked_by, error (exception
+    # text) and the transfer stats
+    stages = stages or DEFAULT_STAGES
+    page = {"text": None, "blocked_by": None, "error": None, "stats": {"bytes_wire": 0, "bytes_decoded": 0}}
+    try:
+        raw_text = stages["fetch"](url, stats=page["stats"])
+        page["text"] = stages["extract"](raw_text, rules)
+        page["blocked_by"] = rules.blocked_by(page["text"], page_title(raw_text))
+    except Exception as e:
+        page["error"] = str(e)
+    return page
+
+def compare_page(alarm, url, page, prev_text, run_time_str, opts=None, prev_index=None,
+                 sink=None, diff_limit="default", report_as=None, stages=None):
+    # Returns a result dict: summary row, snapshot row (None when blocked
+    # or errored), preview diff rows and the new snapshot index entry. Diff
+    # rows go to sink as they are produced; report_as overrides their
+    # alarm_name.
+    stages = stages or DEFAULT_STAGES
+    if diff_limit == "default":
+        diff_limit = diff_row_limit()
+    result = {"summary": None, "snapshot": None, "diffs": [], "index": None}
+    truncated = False
+    stats = page["stats"]
+    try:
+        if page["error"] is not None:
+            raise RuntimeError(page["error"])
+        current_norm = page["text"]
+
+        # If blocked, skip snapshot and diff
+        blocked_by = page["blocked_by"]
+        if blocked_by is not None:
+            print(f"{alarm}: BLOCKED by '{blocked_by}' (snapshot skipped)")
+            result["summary"] = {
+                "run_time": run_time_str,
+                "alarm_name": alarm,
+                "url": url,
+                "change_flag": "BLOCKED",
+                "change_count": "LOGIN_OR_BOT_GATE",
+                **stats,
+            }
+            return result
+
+        diff_mode = alarm_diff_mode(opts)
+        minor_bits = alarm_minor_bits(opts)
+        prev_index = prev_index or {}
+        line_hashes = None
+        fingerprint = None
+        distance = None
+
+        if minor_bits > 0:
+            fingerprint = stages["fingerprint"](str(current_norm))
+
+        if prev_text is None:
+            change_flag = "FIRST_RUN"
+            change_count = 0
+            changes = []
+        else:
+            if fingerprint is not None and str(prev_text) != str(current_norm):
+                prev_fingerprint = prev_index.get("simhash") or stages["fingerprint"](str(prev_text))
+                distance = hamming(prev_fingerprint, fingerprint)
+
+            if distance is not None and distance <= minor_bits:
+                # Compare future runs against the last reported version so
+                # small edits cannot drift past the threshold unnoticed
+                change_flag = "MINOR_CHANGE"
+                change_count = 0
+                changes = []
+                fingerprint = prev_fingerprint
+            elif str(prev_text) != str(current_norm):
+                rows, line_hashes = stages["diff"](str(prev_text), str(current_norm), prev_index, diff_mode)
+                base = {"run_time": run_time_str, "alarm_name": report_as or alarm, "url": url}
+                change_count, truncated, changes = stream_diff_rows(rows, base, sink, diff_limit)
+                change_flag = "CHANGED"
+            else:
+                change_flag = "NO_CHANGE"
+                change_count = 0
+                changes = []
+                if prev_index.get("text_hash") == text_hash(str(current_norm)):
+                    line_hashes = prev_index.get("line_hashes")
+                if fingerprint is not None:
+                    fingerprint = prev_index.get("simhash") or fingerprint
+
+        index = {}
+        if diff_mode == "incremental":
+            if line_hashes is None:
+                line_hashes = build_line_index(str(current_norm).splitlines())
+            index["line_hashes"] = line_hashes
+            index["text_hash"] = text_hash(str(current_norm))
+        if fingerprint is not None:
+            index["simhash"] = fingerprint
+        result["index"] = index or None
+
+        result["snapshot"] = {
+            "run_time": run_time_str,
+            "alarm_name": alarm,
+            "url": url,
+            "content": str(current_norm),
+        }
+
+        result["summary"] = {
+            "run_time": run_time_str,
+            "alarm_name": alarm,
+            "url": url,
+            "change_flag": change_flag,
+            "change_count": change_count,
+            **stats,
+            "diff_truncated": int(truncated),
+        }
+
+        result["diffs"] = changes
+
+        detail = f"{distance} bits" if change_flag == "MINOR_CHANGE" else change_count
+        print(f"{alarm}: {change_flag} ({detail}{', truncated' if truncated else ''}) {stats['bytes_wire']}/{stats['bytes_decoded']} bytes wire/decoded")
+        return result
+
+    except Exception as e:
+        print(f"{alarm}: ERROR {e}")
+        result["summary"] = {
+            "run_time": run_time_str,
+            "alarm_name": alarm,
+            "url": url,
+            "change_flag": "ERROR",
+            "change_count": str(e),
+            **stats,
+        }
+        return result
+
+def check_alarm(alarm, url, rules, prev_text, run_time_str, opts=None, prev_index=None,
+                sink=None, diff_limit="default", report_as=None, stages=None):
+    page = fetch_page(url, rules, stages)
+    return compare_page(
+        alarm, url, page, prev_text, run_time_str, opts=opts, prev_index=prev_index,
+        sink=sink, diff_limit=diff_limit, report_as=report_as, stages=stages,
+    )
+
+# --------------------------------------
+# FEED ALARMS
+# --------------------------------------
+
+def check_feed_alarm(alarm, url, rules, run_time_str, opts, alarm_feed_state, prev_snapshots, snapshot_index,
+                     sink=None, stages=None, budget=None):
+    # Same result dict as check_alarm plus "sub_results" (snapshot + index
+    # of each entry page) and the updated "feed_state" for this alarm.
+    # Entry pages are stored under "<alarm>::<entry url>". Once the run
+    # budget is spent the remaining entries are left for the next run.
+    stages = stages or DEFAULT_STAGES
+    state = dict(alarm_feed_state or {})
+    stats = {"bytes_wire": 0, "bytes_decoded": 0}
+
+    def fetch(u):
+        return stages["fetch"](u, stats=stats)
+
+    try:
+        feed_url, prefix = resolve_feed_url(fetch, url, opts.get(SHEET_FEED_COLUMN), state)
+    except Exception as e:
+        feed_url, prefix = "", ""
+        print(f"{alarm}: feed discovery failed {e}")
+
+    if feed_url == "":
+        prev_row = prev_snapshots.get(alarm)
+        result = check_alarm(
+            alarm, url, rules, prev_row["content"] if prev_row is not None else None, run_time_str,
+            opts=opts, prev_index=snapshot_index.get(alarm), sink=sink, stages=stages,
+        )
+        result["feed_state"] = state
+        return result
+
+    prefix = opts.get(SHEET_FEED_PREFIX_COLUMN) or prefix
+    result = {"summary": None, "snapshot": None, "diffs": [], "index": None, "sub_results": [], "feed_state": state}
+
+    def summary(change_flag, change_count):
+        return {
+            "run_time": run_time_str,
+            "alarm_name": alarm,
+            "url": url,
+            "change_flag": change_flag,
+            "change_count": change_count,
+            **stats,
+            "diff_truncated": int(truncated),
+        }
+
+    truncated = False
+    try:
+        entries = read_feed(fetch, feed_url)
+    except Exception as e:
+        print(f"{alarm}: ERROR feed {e}")
+        result["summary"] = summary("ERROR", f"feed: {e}")
+        return result
+
+    # First look at the feed: remember what exists. Entry pages known this
+    # way get their baseline fetched from whatever is left of
+    # FEED_MAX_PAGES, a few runs' worth at a time.
+    listed = changed_entries(entries, {}, prefix)
+    first_run = "entries" not in state
+    if first_run:
+        state["entries"] = {e["id"]: e["updated"] for e in listed}
+        todo = []
+    else:
+        todo = changed_entries(entries, state["entries"], prefix)
+    todo_ids = {e["id"] for e in todo}
+    unstored = [e for e in listed if e["id"] not in todo_ids and f"{alarm}::{e['url']}" not in prev_snapshots]
+    live_ids = {e["id"] for e in entries}
+    seen = {k: v for k, v in state["entries"].items() if k in live_ids}
+
+    # The per-alarm diff row cap is shared by all entry pages
+    limit = diff_row_limit()
+    written = 0
+    pages = 0
+    baselines = 0
+    reached = 0
+    failed = {}
+    work = [(e, False) for e in todo] + [(e, True) for e in unstored]
+    for entry, baseline_only in work[:FEED_MAX_PAGES]:
+        if budget is not None and budget.exhausted() is not None:
+            break
+        reached += 1
+        key = f"{alarm}::{entry['url']}"
+        prev_row = prev_snapshots.get(key)
+        known = entry["id"] in state["entries"]
+        # New entries diff against an empty page so their text is reported.
+        # Known entries without a stored page are fetched as FIRST_RUN.
+        if prev_row is not None:
+            prev_text = prev_row["content"]
+        elif known:
+            prev_text = None
+        else:
+            prev_text = ""
+
+        sub = check_alarm(
+            key, entry["url"], rules, prev_text, run_time_str, opts=opts, prev_index=snapshot_index.get(key),
+            sink=None if truncated else sink,
+            diff_limit=None if limit is None else max(limit - written, 0),
+            report_as=alarm,
+            stages=stages,
+        )
+        for k in stats:
+            stats[k] += sub["summary"].get(k, 0)
+        flag = sub["summary"]["change_flag"]
+        if sub["snapshot"] is None:
+            # Blocked or failed entries stay unseen and are retried next run
+            failed[flag] = failed.get(flag, 0) + 1
+            continue
+
+        seen[entry["id"]] = entry["updated"]
+        result["sub_results"].append({"snapshot": sub["snapshot"], "index": sub["index"]})
+        if baseline_only:
+            baselines += 1
+            continue
+        pages += 1
+        if truncated or (limit is not None and written >= limit):
+            continue
+        if prev_row is None and known:
+            # Updated before its baseline was stored: nothing to diff
+            # against, so the update is reported with one marker row
+            row = {
+                "run_time": run_time_str,
+                "alarm_name": alarm,
+                "url": entry["url"],
+                "line_no": 0,
+                "before": "",
+                "after": f"[entry updated {entry['updated']}; no earlier copy stored to diff against]",
+                "before_len": 0,
+                "after_len": 0,
+                "delta_len": 0,
+                "change_type": "updated",
+            }
+            if sink is not None:
+                sink(row)
+            if len(result["diffs"]) < DIFF_PREVIEW_ROWS:
+                result["diffs"].append(row)
+            written += 1
+        elif flag == "CHANGED":
+            written += int(sub["summary"]["change_count"])
+            truncated = bool(sub["summary"]["diff_truncated"])
+            result["diffs"].extend(sub["diffs"][:DIFF_PREVIEW_ROWS - len(result["diffs"])])
+
+    state["entries"] = seen
+    n_failed = sum(failed.values())
+    if written > 0:
+        change_flag, change_count = "CHANGED", written
+    elif n_failed:
+        # Nothing changed but entry pages could not be read: surface it
+        # like a failed page so it reaches the issues alerts
+        change_flag = "ERROR" if failed.get("ERROR") else "BLOCKED"
+        change_count = f"{n_failed} of {reached} entry pages failed ({', '.join(f'{k} {v}' for k, v in sorted(failed.items()))})"
+    elif first_run:
+        change_flag, change_count = "FIRST_RUN", 0
+    else:
+        change_flag, change_count = "NO_CHANGE", 0
+    result["summary"] = summary(change_flag, change_count)
+
+    left = max(0, len(todo) - reached)
+    print(
+        f"{alarm}: {change_flag} feed ({len(listed)} entries, {len(todo)} new/updated, {pages} pages checked, "
+        f"{baselines} baselines stored, {n_failed} failed, {left} left for next run)"
+    )
+    return result
@@ -0,0 +1,106 @@
+import json
+import os
+
+# --------------------------------------
+# RUN JOURNAL (write-ahead log)
+# --------------------------------------
+# One JSON line per event, fsynced as it is written:
+#   start  - a run began (run_id is the run time string)
+#   result - one alarm finished; holds the check_alarm result and the
+#            size of the streamed diff file after its rows
+#   saving - final files are about to be written; holds the sizes of the
+#            appended history files so a retry can roll them back
+#   end    - files written, the run is complete
+
+def _fsync_line(f, obj):
+    f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def _drop_torn_tail(path):
+    if os.path.isfile(path) is False:
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+    keep = data.rfind(b"\n") + 1
+    if keep < len(data):
+        truncate_to(path, keep)
+
+class RunJournal:
+    def __init__(self, path, run_id, resume=False):
+        self.path = path
+        self.run_id = run_id
+        if resume:
+            _drop_torn_tail(path)
+        self._f = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume is False:
+            _fsync_line(self._f, {"event": "start", "run_id": run_id})
+
+    def record(self, alarm, result, diff_size=None):
+        _fsync_line(self._f, {
+            "event": "result",
+            "run_id": self.run_id,
+            "alarm": alarm,
+            "result": result,
+            "diff_size": diff_size,
+        })
+
+    def saving(self, snapshot_size, history_size=None):
+        _fsync_line(self._f, {
+            "event": "saving",
+            "run_id": self.run_id,
+            "snapshot_size": snapshot_size,
+            "history_size": history_size,
+        })
+
+    def finish(self):
+        _fsync_line(self._f, {"event": "end", "run_id": self.run_id})
+        self._f.close()
+
+    def close(self):
+        if self._f.closed is False:
+            self._f.close()
+
+def load_incomplete_run(path):
+    # Returns (run_id, {alarm: result}, saved file sizes) for a run that
+    # started but never wrote "end", otherwise (None, {}, {})
+    if os.path.isfile(path) is False:
+        return None, {}, {}
+
+    run_id = None
+    done = {}
+    sizes = {}
+    ended = False
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                # Torn last line from a crash mid-write
+                break
+            kind = ev.get("event")
+            if kind == "start":
+                run_id = ev.get("run_id")
+                done = {}
+                sizes = {}
+                ended = False
+            elif kind == "result" and ev.get("run_id") == run_id:
+                done[ev["alarm"]] = ev["result"]
+                if ev.get("diff_size") is not None:
+                    sizes["diff_size"] = ev["diff_size"]
+            elif kind == "saving" and ev.get("run_id") == run_id:
+                sizes.update({k: v for k, v in ev.items() if k.endswith("_size")})
+            elif kind == "end" and ev.get("run_id") == run_id:
+                ended = True
+
+    if run_id is None or ended:
+        return None, {}, {}
+    return run_id, done, sizes
+
+def truncate_to(path, size):
+    if size is None or os.path.isfile(path) is False:
+        return
+    if os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
@@ -0,0 +1,85 @@
+import difflib
+
+from .linediff import incremental_diff_rows
+
+# --------------------------------------
+# DIFF STAGE
+# --------------------------------------
+
+# Rows per alarm kept in memory for the email body
+DIFF_PREVIEW_ROWS = 300
+
+def iter_diff_rows(before, after, max_field_len=4000):
+    before_lines = (before or "").splitlines()
+    after_lines = (after or "").splitlines()
+
+    line_no = 0
+    before_buf = None
+
+    for d in difflib.ndiff(before_lines, after_lines):
+        code = d[0]
+        text = d[2:]
+
+        if code == " ":
+            line_no += 1
+            before_buf = None
+        elif code == "-":
+            before_buf = text
+        elif code == "+":
+            b = before_buf or ""
+            yield {
+                "line_no": line_no,
+                "before": b[:max_field_len],
+                "after": text[:max_field_len],
+                "before_len": len(b),
+                "after_len": len(text),
+                "delta_len": len(text) - len(b),
+                "change_type": "edit",
+            }
+            before_buf = None
+
+def diff_to_rows(before, after, max_field_len=4000):
+    return list(iter_diff_rows(before, after, max_field_len))
+
+def line_diff(before, after, prev_index=None, mode="full"):
+    # Default diff stage. Returns (row generator, line hashes of after or
+    # None). "incremental" diffs only the changed region against the
+    # stored line-hash index.
+    if mode == "incremental":
+        prev_index = prev_index or {}
+        return incremental_diff_rows(
+            before, after, before_hashes=prev_index.get("line_hashes"), before_text_hash=prev_index.get("text_hash"),
+        )
+    return iter_diff_rows(before, after), None
+
+def stream_diff_rows(rows, base, sink=None, limit=None, preview_rows=DIFF_PREVIEW_ROWS):
+    # Pulls rows from the diff generator and hands each one to sink (the
+    # archive writer). Stops after limit rows and writes a truncated marker
+    # instead of the rest. Returns (rows written, truncated, preview rows).
+    count = 0
+    preview = []
+    for c in rows:
+        if limit is not None and count >= limit:
+            row = {
+                **base,
+                "line_no": c["line_no"],
+                "before": "",
+                "after": f"[diff truncated after {limit} rows]",
+                "before_len": 0,
+                "after_len": 0,
+                "delta_len": 0,
+                "change_type": "truncated",
+            }
+            if sink is not None:
+                sink(row)
+            if len(preview) < preview_rows:
+                preview.append(row)
+            return count, True, preview
+
+        row = {**base, **c}
+        if sink is not None:
+            sink(row)
+        if len(preview) < preview_rows:
+            preview.append(row)
+        count += 1
+    return count, False, preview
@@ -0,0 +1,46 @@
+import json
+
+from .rules import RuleEngine
+
+# --------------------------------------
+# EXTRACT STAGE
+# --------------------------------------
+# bs4 is imported inside normalize_content so importing the package stays
+# cheap for the report and export commands.
+
+DEFAULT_RULES = RuleEngine().for_alarm()
+
+def is_blocked_page(text: str, rules=None, title: str = "") -> bool:
+    rules = rules or DEFAULT_RULES
+    return rules.is_blocked(text, title)
+
+def strip_noise_lines(text: str, rules=None) -> str:
+    rules = rules or DEFAULT_RULES
+    return rules.strip_noise(text)
+
+def normalize_content(raw_text, rules=None):
+    from bs4 import BeautifulSoup
+
+    raw_text = (raw_text or "").strip()
+
+    # JSON input normalization
+    try:
+        obj = json.loads(raw_text)
+        if isinstance(obj, (dict, list)):
+            raw_text = json.dumps(obj, ensure_ascii=False, sort_keys=True)
+    except Exception:
+        pass
+
+    soup = BeautifulSoup(raw_text, "html.parser")
+
+    for tag in soup(["script", "style", "noscript"]):
+        tag.extract()
+
+    text = soup.get_text("\n")
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    cleaned = "\n".join(lines)
+
+    cleaned = strip_noise_lines(cleaned, rules)
+
+    cleaned_lines = [l.strip() for l in cleaned.splitlines() if l.strip()]
+    return "\n".join(cleaned_lines)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlparse
+
+# --------------------------------------
+# FEED MODE (sitemap / RSS / Atom)
+# --------------------------------------
+# An alarm with a feed_url sheet column ("auto" to discover one) is checked
+# through its feed: one request lists every entry with its id and lastmod,
+# and only new or updated entries go through the full page pipeline.
+
+FEED_STATE_JSON = "feed_state.json"
+
+SHEET_FEED_COLUMN = "feed_url"
+SHEET_FEED_PREFIX_COLUMN = "feed_prefix"
+
+# Pages fetched per alarm per run; the rest stay unseen until next run
+FEED_MAX_PAGES = 25
+
+# Child sitemaps read from a sitemap index
+FEED_MAX_SITEMAPS = 10
+
+_ALT_LINK_RE = re.compile(r"<link\b[^>]*>", flags=re.IGNORECASE)
+_ATTR_RE = re.compile(r'(\w+)\s*=\s*["\']([^"\']*)["\']')
+
+FEED_TYPES = ("application/rss+xml", "application/atom+xml", "application/xml", "text/xml")
+
+def load_feed_state(path=FEED_STATE_JSON) -> dict:
+    if os.path.isfile(path) is False:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print("Feed state unreadable, starting over:", e)
+        return {}
+
+def save_feed_state(state, path=FEED_STATE_JSON):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+# --------------------------------------
+# PARSING
+# --------------------------------------
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1].lower()
+
+def _child_text(el, *names):
+    for child in el:
+        if _local(child.tag) in names:
+            if (child.text or "").strip():
+                return child.text.strip()
+            if child.get("href"):
+                return child.get("href").strip()
+    return ""
+
+def _stamp(el):
+    # Feeds without dates still change their text when an item is edited
+    return hashlib.blake2b(ET.tostring(el), digest_size=8).hexdigest()
+
+def parse_feed(xml_text):
+    # Returns (kind, entries) with kind in rss / atom / sitemap /
+    # sitemapindex and entries as dicts with id, url, updated
+    root = ET.fromstring((xml_text or "").strip().encode("utf-8"))
+    kind = _local(root.tag)
+    entries = []
+
+    if kind == "rss" or kind == "rdf":
+        for item in root.iter():
+            if _local(item.tag) != "item":
+                continue
+            url = _child_text(item, "link")
+            entries.append({
+                "id": _child_text(item, "guid") or url,
+                "url": url,
+                "updated": _child_text(item, "updated", "pubdate", "date") or _stamp(item),
+            })
+        return "rss", entries
+
+    if kind == "feed":
+        for item in root:
+            if _local(item.tag) != "entry":
+                continue
+            url = ""
+            for link in item:
+                if _local(link.tag) == "link" and link.get("rel", "alternate") == "alternate":
+                    url = link.get("href", "")
+                    break
+            entries.append({
+                "id": _child_text(item, "id") or url,
+                "url": url,
+                "updated": _child_text(item, "updated", "published") or _stamp(item),
+            })
+        return "atom", entries
+
+    if kind in ("urlset", "sitemapindex"):
+        for item in root:
+            url = _child_text(item, "loc")
+            if url:
+                entries.append({"id": url, "url": url, "updated": _child_text(item, "lastmod")})
+        return ("sitemap" if kind == "urlset" else "sitemapindex"), entries
+
+    raise ValueError(f"Not a feed or sitemap: <{kind}>")
+
+def discover_feed(page_url, html):
+    # <link rel="alternate" type="application/rss+xml"> first, then the
+    # site sitemap. Candidates are verified by the caller.
+    candidates = []
+    for tag in _ALT_LINK_RE.findall(html or ""):
+        attrs = {k.lower(): v for k, v in _ATTR_RE.findall(tag)}
+        if "alternate" in attrs.get("rel", "").lower() and attrs.get("type", "").lower() in FEED_TYPES:
+            if attrs.get("href"):
+                candidates.append(urljoin(page_url, attrs["href"]))
+    candidates.append(urljoin(page_url, "/sitemap.xml"))
+    return candidates
+
+def default_prefix(page_url):
+    # A discovered site sitemap is narrowed to the alarm page's section:
+    # the page path itself (/news -> /news/), or its folder when the last
+    # segment looks like a file (/news/index.html -> /news/)
+    p = urlparse(page_url)
+    path = p.path or "/"
+    last = path.rsplit("/", 1)[-1]
+    if "." in last:
+        path = path[:len(path) - len(last)]
+    return f"{p.scheme}://{p.netloc}{path.rstrip('/')}/"
+
+# --------------------------------------
+# READING + CHANGE DETECTION
+# --------------------------------------
+
+def read_feed(fetch, feed_url):
+    kind, entries = parse_feed(fetch(feed_url))
+    if kind != "sitemapindex":
+        return entries
+    out = []
+    for child in entries[:FEED_MAX_SITEMAPS]:
+        _, child_entries = parse_feed(fetch(child["url"]))
+        out.extend(child_entries)
+    return out
+
+def resolve_feed_url(fetch, page_url, configured, alarm_state):
+    # Returns (feed_url, prefix). An "auto" lookup is cached in the alarm
+    # state, including a failed one (empty string).
+    configured = (configured or "").strip()
+    if configured.lower() != "auto":
+        return configured, ""
+    if "feed_url" in alarm_state:
+        found = alarm_state["feed_url"]
+        # Recomputed so a prefix cached by an older rule is corrected
+        alarm_state["prefix"] = default_prefix(page_url) if found.endswith("sitemap.xml") else ""
+        return found, alarm_state["prefix"]
+
+    found = ""
+    html = fetch(page_url)
+    for candidate in discover_feed(page_url, html):
+        try:
+            if read_feed(fetch, candidate):
+                found = candidate
+                break
+        except Exception as e:
+            print("Feed candidate rejected:", candidate, e)
+
+    prefix = default_prefix(page_url) if found.endswith("sitemap.xml") else ""
+    alarm_state["feed_url"] = found
+    alarm_state["prefix"] = prefix
+    print("Feed discovery:", page_url, "->", found or "none")
+    return found, prefix
+
+def changed_entries(entries, seen, prefix=""):
+    out = []
+    for e in entries:
+        if e["url"] == "" or (prefix and e["url"].startswith(prefix) is False):
+            continue
+        if seen.get(e["id"]) != e["updated"]:
+            out.append(e)
+    return out
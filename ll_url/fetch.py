@@ -0,0 +1,163 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from urllib3.util.request import ACCEPT_ENCODING
+
+from .replay import FixtureStore, RecordingSession, ReplaySession, ReplayServer, outbox_post
+
+# --------------------------------------
+# FETCH STAGE
+# --------------------------------------
+# One shared session for every request of a run. It is safe to use from
+# the pipeline's fetch threads; the connection pool is sized to match.
+
+TIMEOUT = 30
+
+# live, record (every response is saved to HTTP_FIXTURE_DIR) or replay
+# (answered from those fixtures by a local server; alerts go to an outbox
+# file instead of Discord / SendGrid)
+HTTP_MODE = os.getenv("HTTP_MODE", "live").strip().lower() or "live"
+HTTP_FIXTURE_DIR = os.getenv("HTTP_FIXTURE_DIR", "http_fixtures").strip() or "http_fixtures"
+
+# Body size limits while streaming. MAX_DECODE_RATIO (decoded / wire bytes)
+# only applies past DECODE_RATIO_FLOOR so small, well-compressed pages pass.
+MAX_DECODED_BYTES = int(os.getenv("MAX_DECODED_BYTES", str(25 * 1024 * 1024)) or 0)
+MAX_DECODE_RATIO = 100
+DECODE_RATIO_FLOOR = 1024 * 1024
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+    "Connection": "keep-alive",
+}
+
+# --------------------------------------
+# HTTP SESSION
+# --------------------------------------
+
+def build_session():
+    if HTTP_MODE == "replay":
+        s = ReplaySession(get_replay_server())
+    elif HTTP_MODE == "record":
+        s = RecordingSession(FixtureStore(HTTP_FIXTURE_DIR))
+    else:
+        s = requests.Session()
+    s.headers.update(DEFAULT_HEADERS)
+    # urllib3 lists every decoder it can use here: gzip and deflate always,
+    # br when brotli/brotlicffi is installed, zstd when zstandard is
+    s.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    retries = Retry(
+        total=3,
+        connect=3,
+        read=3,
+        backoff_factor=1.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=20, pool_maxsize=20)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+_session = None
+_replay_server = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+    return _session
+
+def get_replay_server():
+    global _replay_server
+    if _replay_server is None:
+        _replay_server = ReplayServer(FixtureStore(HTTP_FIXTURE_DIR)).start()
+    return _replay_server
+
+def reset_session():
+    # Drops the shared session, e.g. after switching HTTP_MODE
+    global _session, _replay_server
+    if _replay_server is not None:
+        _replay_server.stop()
+    _session = None
+    _replay_server = None
+
+def start_replay(fixture_dir=None, **faults):
+    # Switches the process to replay mode, serving fixture_dir with the
+    # given ReplayServer fault settings
+    global HTTP_MODE, HTTP_FIXTURE_DIR, _replay_server
+    reset_session()
+    HTTP_MODE = "replay"
+    # Absolute, so fixture bodies are still found after a chdir
+    HTTP_FIXTURE_DIR = os.path.abspath(fixture_dir or HTTP_FIXTURE_DIR)
+    _replay_server = ReplayServer(FixtureStore(HTTP_FIXTURE_DIR), **faults).start()
+    return _replay_server
+
+# --------------------------------------
+# READ
+# --------------------------------------
+
+def archive_url(url: str) -> str:
+    return "https://web.archive.org/web/0/" + url
+
+def read_body(resp, stats=None):
+    # Streams and decodes the body, stopping at the decompression budget.
+    # stats gets bytes_wire (as sent, compressed) and bytes_decoded added.
+    chunks = []
+    decoded = 0
+    try:
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            decoded += len(chunk)
+            wire = resp.raw.tell()
+            if MAX_DECODED_BYTES and decoded > MAX_DECODED_BYTES:
+                raise ValueError(f"Body over {MAX_DECODED_BYTES} bytes after decoding")
+            if decoded > DECODE_RATIO_FLOOR and decoded > MAX_DECODE_RATIO * max(wire, 1):
+                raise ValueError(f"Decompression ratio over {MAX_DECODE_RATIO}x ({decoded} from {wire} bytes)")
+            chunks.append(chunk)
+    finally:
+        wire = resp.raw.tell()
+        resp.close()
+        if stats is not None:
+            stats["bytes_wire"] = stats.get("bytes_wire", 0) + wire
+            stats["bytes_decoded"] = stats.get("bytes_decoded", 0) + decoded
+
+    return b"".join(chunks).decode(resp.encoding or "utf-8", errors="replace")
+
+def fetch_text(url, session=None, stats=None):
+    session = session or get_session()
+    resp = session.get(url, timeout=TIMEOUT, stream=True)
+
+    if resp.status_code == 403:
+        resp.close()
+        print("403 blocked. Trying archive:", url)
+        ar = session.get(archive_url(url), timeout=TIMEOUT, stream=True)
+        if ar.status_code >= 400:
+            ar.close()
+        ar.raise_for_status()
+        return read_body(ar, stats)
+
+    if resp.status_code >= 400:
+        resp.close()
+    resp.raise_for_status()
+    return read_body(resp, stats)
+
+# --------------------------------------
+# NOTIFICATION POST
+# --------------------------------------
+
+def post_notification(url, payload, headers=None):
+    if HTTP_MODE == "replay":
+        return outbox_post(url, payload)
+    return requests.post(url, json=payload, headers=headers, timeout=30)
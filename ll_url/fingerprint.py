@@ -0,0 +1,44 @@
+import hashlib
+
+# --------------------------------------
+# SIMHASH OVER LINE SHINGLES
+# --------------------------------------
+# A 64-bit SimHash of the normalized text. Pages that differ only by a
+# timestamp, a counter or a rotating quote end up a few bits apart, real
+# edits flip many more. Stored hex strings make the per-run check a single
+# XOR + popcount.
+
+SHINGLE_LINES = 3
+SIMHASH_BITS = 64
+
+def _shingle_hashes(lines, k=SHINGLE_LINES):
+    if len(lines) == 0:
+        return []
+    if len(lines) < k:
+        k = len(lines)
+    out = []
+    for i in range(len(lines) - k + 1):
+        s = "\n".join(lines[i:i + k]).encode("utf-8")
+        out.append(int.from_bytes(hashlib.blake2b(s, digest_size=8).digest(), "big"))
+    return out
+
+def simhash(text, k=SHINGLE_LINES) -> str:
+    hashes = _shingle_hashes((text or "").splitlines(), k)
+    n = len(hashes)
+    counts = [0] * SIMHASH_BITS
+    for h in hashes:
+        b = 0
+        while h:
+            if h & 1:
+                counts[b] += 1
+            h >>= 1
+            b += 1
+
+    value = 0
+    for b in range(SIMHASH_BITS):
+        if counts[b] * 2 > n:
+            value |= 1 << b
+    return f"{value:016x}"
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
@@ -0,0 +1,244 @@
+import glob
+import importlib.util
+import os
+import uuid
+from datetime import datetime
+
+from .polling import RUN_TIME_FORMAT
+from .records import iter_records
+
+# --------------------------------------
+# COLUMNAR HISTORY (Parquet, optional)
+# --------------------------------------
+# Typed, date-partitioned copy of the summary and diff history:
+#   history/summary/run_date=YYYY-MM-DD/part-*.parquet
+#   history/diffs/run_date=YYYY-MM-DD/part-*.parquet
+# alarm_name / change_flag / change_type are dictionary encoded,
+# change_count is numeric and the error text of ERROR / BLOCKED rows moves
+# to its own column. Needs pyarrow; without it export is skipped.
+
+HISTORY_DATASET_DIR = os.getenv("HISTORY_DATASET_DIR", "history").strip() or "history"
+
+def pyarrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+def _schemas():
+    import pyarrow as pa
+
+    label = pa.dictionary(pa.int32(), pa.string())
+    summary = pa.schema([
+        ("run_time", pa.timestamp("s")),
+        ("alarm_name", label),
+        ("url", pa.string()),
+        ("change_flag", label),
+        ("change_count", pa.int64()),
+        ("error", pa.string()),
+        ("bytes_wire", pa.int64()),
+        ("bytes_decoded", pa.int64()),
+        ("diff_truncated", pa.bool_()),
+    ])
+    diffs = pa.schema([
+        ("run_time", pa.timestamp("s")),
+        ("alarm_name", label),
+        ("url", pa.string()),
+        ("line_no", pa.int64()),
+        ("before", pa.string()),
+        ("after", pa.string()),
+        ("before_len", pa.int64()),
+        ("after_len", pa.int64()),
+        ("delta_len", pa.int64()),
+        ("change_type", label),
+    ])
+    return {"summary": summary, "diffs": diffs}
+
+def _int_or_none(v):
+    try:
+        return int(str(v).strip())
+    except (TypeError, ValueError):
+        return None
+
+def _time(v):
+    if isinstance(v, datetime):
+        return v
+    return datetime.strptime(str(v), RUN_TIME_FORMAT)
+
+def _summary_columns(rows):
+    cols = {name: [] for name in _schemas()["summary"].names}
+    for r in rows:
+        count = _int_or_none(r.get("change_count"))
+        cols["run_time"].append(_time(r["run_time"]))
+        cols["alarm_name"].append(r.get("alarm_name"))
+        cols["url"].append(r.get("url"))
+        cols["change_flag"].append(r.get("change_flag"))
+        cols["change_count"].append(count)
+        cols["error"].append(None if count is not None else str(r.get("change_count") or ""))
+        cols["bytes_wire"].append(_int_or_none(r.get("bytes_wire")))
+        cols["bytes_decoded"].append(_int_or_none(r.get("bytes_decoded")))
+        cols["diff_truncated"].append(bool(_int_or_none(r.get("diff_truncated"))))
+    return cols
+
+def _diff_columns(rows):
+    cols = {name: [] for name in _schemas()["diffs"].names}
+    for r in rows:
+        cols["run_time"].append(_time(r["run_time"]))
+        for k in ("alarm_name", "url", "before", "after"):
+            cols[k].append(None if r.get(k) is None else str(r.get(k)))
+        for k in ("line_no", "before_len", "after_len", "delta_len"):
+            cols[k].append(_int_or_none(r.get(k)))
+        cols["change_type"].append(r.get("change_type") or "edit")
+    return cols
+
+# --------------------------------------
+# EXPORT
+# --------------------------------------
+
+def _write_partitioned(table_name, cols, root):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schemas()[table_name]
+    if len(cols["run_time"]) == 0:
+        return []
+
+    by_date = {}
+    for i, t in enumerate(cols["run_time"]):
+        by_date.setdefault(t.strftime("%Y-%m-%d"), []).append(i)
+
+    written = []
+    for run_date, idx in sorted(by_date.items()):
+        part = {k: [v[i] for i in idx] for k, v in cols.items()}
+        table = pa.table(part, schema=schema)
+        out_dir = os.path.join(root, table_name, f"run_date={run_date}")
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = max(part["run_time"]).strftime("%Y%m%d%H%M%S")
+        path = os.path.join(out_dir, f"part-{stamp}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        written.append(path)
+    return written
+
+def compact_partitions(root=HISTORY_DATASET_DIR, keep_date=None):
+    # Merges each day's per-run files into one file. The current day is
+    # left alone while runs are still adding to it.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    merged = 0
+    for table_name in ("summary", "diffs"):
+        for part_dir in sorted(glob.glob(os.path.join(root, table_name, "run_date=*"))):
+            if keep_date and part_dir.endswith(f"run_date={keep_date}"):
+                continue
+            files = sorted(glob.glob(os.path.join(part_dir, "part-*.parquet")))
+            if len(files) <= 1:
+                continue
+            table = pa.concat_tables([pq.ParquetFile(f).read() for f in files])
+            out = os.path.join(part_dir, "part-day.parquet")
+            pq.write_table(table, out + ".tmp")
+            # The merged file is in place before any source is removed, so
+            # a crash in between leaves duplicates, never a lost day
+            os.replace(out + ".tmp", out)
+            for f in files:
+                if f != out:
+                    os.remove(f)
+            merged += 1
+    return merged
+
+def export_run(summary_rows, diff_rows, root=HISTORY_DATASET_DIR):
+    if pyarrow_available() is False:
+        print("History export skipped. pyarrow not installed.")
+        return []
+    written = _write_partitioned("summary", _summary_columns(summary_rows), root)
+    written += _write_partitioned("diffs", _diff_columns(diff_rows), root)
+    if summary_rows:
+        compact_partitions(root, keep_date=_time(summary_rows[0]["run_time"]).strftime("%Y-%m-%d"))
+    return written
+
+def _exported_run_times(table_name, root):
+    import pyarrow.dataset as ds
+
+    path = os.path.join(root, table_name)
+    if os.path.isdir(path) is False:
+        return set()
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    return set(dataset.to_table(columns=["run_time"]).column("run_time").unique().to_pylist())
+
+def export_csv_history(summary_csv, diff_csv, root=HISTORY_DATASET_DIR):
+    # Backfill from the CSV files. Runs already in the dataset (every run
+    # exports its own rows) are skipped, so this is safe to repeat.
+    written = []
+    for table_name, path, columns in (("summary", summary_csv, _summary_columns), ("diffs", diff_csv, _diff_columns)):
+        if os.path.isfile(path) is False:
+            continue
+        exported = _exported_run_times(table_name, root)
+        rows = (r for r in iter_records(path) if _time(r["run_time"]) not in exported)
+        written += _write_partitioned(table_name, columns(rows), root)
+    compact_partitions(root)
+    return written
+
+# --------------------------------------
+# QUERIES
+# --------------------------------------
+# Each query reads only the columns it needs and prunes date partitions,
+# then aggregates with pandas groupby.
+
+def read_history(table_name, columns, start=None, end=None, root=HISTORY_DATASET_DIR):
+    import pyarrow.dataset as ds
+
+    path = os.path.join(root, table_name)
+    if os.path.isdir(path) is False:
+        raise FileNotFoundError(f"No {table_name} history under {root}. Run an export first.")
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    flt = None
+    if start:
+        flt = ds.field("run_date") >= str(start)
+    if end:
+        cond = ds.field("run_date") <= str(end)
+        flt = cond if flt is None else flt & cond
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()
+
+def alarm_change_stats(start=None, end=None, root=HISTORY_DATASET_DIR):
+    df = read_history("summary", ["alarm_name", "change_flag", "change_count"], start, end, root)
+    df["alarm_name"] = df["alarm_name"].astype(str)
+    flag = df["change_flag"].astype(str)
+    df["is_changed"] = flag == "CHANGED"
+    df["is_issue"] = flag.isin(["ERROR", "BLOCKED"])
+    df["changed_rows"] = df["change_count"].where(df["is_changed"])
+
+    out = df.groupby("alarm_name").agg(
+        polls=("change_flag", "size"),
+        changed=("is_changed", "sum"),
+        issues=("is_issue", "sum"),
+        median_diff_rows=("changed_rows", "median"),
+    )
+    out["p90_diff_rows"] = df.groupby("alarm_name")["changed_rows"].quantile(0.9)
+    out["change_rate"] = out["changed"] / out["polls"]
+    return out.sort_values("changed", ascending=False)
+
+def diff_volume_by_alarm(start=None, end=None, root=HISTORY_DATASET_DIR):
+    df = read_history("diffs", ["alarm_name", "run_time", "delta_len", "after_len"], start, end, root)
+    df["alarm_name"] = df["alarm_name"].astype(str)
+    per_run = df.groupby(["alarm_name", "run_time"]).agg(
+        rows=("delta_len", "size"),
+        chars_after=("after_len", "sum"),
+        net_delta=("delta_len", "sum"),
+    )
+    out = per_run.groupby("alarm_name").agg(
+        changed_runs=("rows", "size"),
+        median_rows=("rows", "median"),
+        median_chars=("chars_after", "median"),
+        total_net_delta=("net_delta", "sum"),
+    )
+    return out.sort_values("changed_runs", ascending=False)
+
+def history_report(start=None, end=None, root=HISTORY_DATASET_DIR):
+    lines = [f"HISTORY {start or 'start'} .. {end or 'now'}", ""]
+    lines.append("CHANGES BY ALARM")
+    lines.append(alarm_change_stats(start, end, root).round(2).to_string())
+    lines.append("")
+    try:
+        lines.append("DIFF VOLUME BY ALARM")
+        lines.append(diff_volume_by_alarm(start, end, root).round(2).to_string())
+    except FileNotFoundError as e:
+        lines.append(str(e))
+    return "\n".join(lines)
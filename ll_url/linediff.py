@@ -0,0 +1,191 @@
+import bisect
+import difflib
+import hashlib
+import json
+import os
+
+# --------------------------------------
+# LINE HASH INDEX
+# --------------------------------------
+# Per-alarm list of line hashes for the last stored version, so the next
+# run can line up old and new pages by hash lookup instead of re-diffing
+# the full text. text_hash is a digest of that whole version; a stored
+# index whose digest does not match the snapshot is rebuilt.
+
+def line_hash(line: str) -> str:
+    return hashlib.blake2b(line.encode("utf-8"), digest_size=8).hexdigest()
+
+def build_line_index(lines) -> list:
+    return [line_hash(l) for l in lines]
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).hexdigest()
+
+def load_snapshot_index(path) -> dict:
+    if os.path.isfile(path) is False:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print("Snapshot index unreadable, rebuilding:", e)
+        return {}
+
+def save_snapshot_index(path, index):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+# --------------------------------------
+# ANCHORS + MOVED BLOCKS
+# --------------------------------------
+
+def _unique_positions(hashes, lo, hi):
+    seen = {}
+    for i in range(lo, hi):
+        h = hashes[i]
+        seen[h] = -1 if h in seen else i
+    return {h: i for h, i in seen.items() if i >= 0}
+
+def _longest_increasing(pairs):
+    # pairs are (before_pos, after_pos) sorted by after_pos. Returns the
+    # longest subsequence that is increasing in before_pos too.
+    tails = []
+    tails_idx = []
+    prev = [-1] * len(pairs)
+    for k, (b, _) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, b)
+        if pos > 0:
+            prev[k] = tails_idx[pos - 1]
+        if pos == len(tails):
+            tails.append(b)
+            tails_idx.append(k)
+        else:
+            tails[pos] = b
+            tails_idx[pos] = k
+
+    keep = set()
+    k = tails_idx[-1] if tails_idx else -1
+    while k >= 0:
+        keep.add(k)
+        k = prev[k]
+    return keep
+
+def _moved_blocks(pairs):
+    # Groups out-of-order anchors that are consecutive on both sides
+    blocks = []
+    for b, a in sorted(pairs, key=lambda p: p[1]):
+        if blocks and blocks[-1][0] + blocks[-1][2] == b and blocks[-1][1] + blocks[-1][2] == a:
+            blocks[-1][2] += 1
+        else:
+            blocks.append([b, a, 1])
+    return blocks
+
+# --------------------------------------
+# INCREMENTAL DIFF
+# --------------------------------------
+
+def incremental_diff_rows(before, after, before_hashes=None, before_text_hash=None, max_field_len=4000):
+    # Same row shape as diff_to_rows. Only the region between the common
+    # prefix and suffix is compared; lines unique to both versions anchor
+    # it, and the gaps between anchors are diffed on hashes. Blocks of
+    # unique lines that moved are reported once as "moved".
+    # Returns (row generator, line hashes of the new version). Rows are
+    # produced lazily so a caller can stop early.
+    before_lines = (before or "").splitlines()
+    after_lines = (after or "").splitlines()
+
+    if before_hashes is None or before_text_hash != text_hash(before):
+        before_hashes = build_line_index(before_lines)
+    after_hashes = build_line_index(after_lines)
+
+    return _incremental_rows(before_lines, after_lines, before_hashes, after_hashes, max_field_len), after_hashes
+
+def _incremental_rows(before_lines, after_lines, before_hashes, after_hashes, max_field_len):
+    nb = len(before_hashes)
+    na = len(after_hashes)
+
+    lo = 0
+    while lo < nb and lo < na and before_hashes[lo] == after_hashes[lo]:
+        lo += 1
+    tail = 0
+    while tail < nb - lo and tail < na - lo and before_hashes[nb - 1 - tail] == after_hashes[na - 1 - tail]:
+        tail += 1
+    b_hi = nb - tail
+    a_hi = na - tail
+
+    ub = _unique_positions(before_hashes, lo, b_hi)
+    ua = _unique_positions(after_hashes, lo, a_hi)
+    pairs = sorted(((ub[h], ua[h]) for h in ub.keys() & ua.keys()), key=lambda p: p[1])
+
+    in_order = _longest_increasing(pairs)
+    anchors = [pairs[k] for k in sorted(in_order)]
+    moved = _moved_blocks([pairs[k] for k in range(len(pairs)) if k not in in_order])
+
+    moved_before = set()
+    moved_after = {}
+    for b, a, n in moved:
+        moved_before.update(range(b, b + n))
+        moved_after[a] = (b, n)
+        moved_after.update({a + k: None for k in range(1, n)})
+
+    line_no = lo
+
+    def edit_row(b, text):
+        return {
+            "line_no": line_no,
+            "before": b[:max_field_len],
+            "after": text[:max_field_len],
+            "before_len": len(b),
+            "after_len": len(text),
+            "delta_len": len(text) - len(b),
+            "change_type": "edit",
+        }
+
+    def diff_gap(b0, b1, a0, a1):
+        nonlocal line_no
+        if a0 == a1:
+            # Nothing inserted here; deletions alone produce no rows
+            return
+        bi = [i for i in range(b0, b1) if i not in moved_before]
+        ai = []
+        for j in range(a0, a1):
+            if j not in moved_after:
+                ai.append(j)
+                continue
+            if moved_after[j] is not None:
+                src, n = moved_after[j]
+                block = "\n".join(after_lines[j:j + n])
+                yield {
+                    "line_no": line_no,
+                    "before": f"[moved from line {src + 1}, {n} lines]",
+                    "after": block[:max_field_len],
+                    "before_len": 0,
+                    "after_len": len(block),
+                    "delta_len": 0,
+                    "change_type": "moved",
+                }
+
+        sm = difflib.SequenceMatcher(
+            None,
+            [before_hashes[i] for i in bi],
+            [after_hashes[j] for j in ai],
+            autojunk=False,
+        )
+        for op, i1, i2, j1, j2 in sm.get_opcodes():
+            if op == "equal":
+                line_no += i2 - i1
+            elif op in ("insert", "replace"):
+                for k in range(j2 - j1):
+                    b = before_lines[bi[i1 + k]] if i1 + k < i2 else ""
+                    yield edit_row(b, after_lines[ai[j1 + k]])
+
+    b_prev = lo
+    a_prev = lo
+    for b, a in anchors:
+        yield from diff_gap(b_prev, b, a_prev, a)
+        line_no += 1
+        b_prev = b + 1
+        a_prev = a + 1
+    yield from diff_gap(b_prev, b_hi, a_prev, a_hi)
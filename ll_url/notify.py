@@ -0,0 +1,145 @@
+import base64
+import os
+
+from .fetch import post_notification
+from .render import (
+    group_run, render_discord_all, render_discord_changed, render_discord_issues,
+    render_email_html, render_email_text,
+)
+
+# --------------------------------------
+# DISCORD ALERTS (3 channels via 3 webhooks)
+# --------------------------------------
+
+DISCORD_WEBHOOK_URL_ALL = os.getenv("DISCORD_WEBHOOK_URL_ALL", "").strip()
+DISCORD_WEBHOOK_URL_CHANGED = os.getenv("DISCORD_WEBHOOK_URL_CHANGED", "").strip()
+DISCORD_WEBHOOK_URL_ERROR = os.getenv("DISCORD_WEBHOOK_URL_ERROR", "").strip()
+
+def send_discord_webhook(webhook_url: str, message: str) -> bool:
+    if webhook_url == "":
+        print("Discord skipped. Webhook missing.")
+        return False
+
+    payload = {"content": message[:1900]}
+    try:
+        r = post_notification(webhook_url, payload)
+        print("Discord status:", r.status_code)
+        if r.status_code >= 400:
+            print("Discord failed:", r.text[:800])
+            return False
+        print("Discord sent ok")
+        return True
+    except Exception as e:
+        print("Discord exception:", e)
+        return False
+
+# --------------------------------------
+# EMAIL ALERTS (SendGrid) with CSV attachment
+# --------------------------------------
+
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", "").strip()
+ALERT_FROM_EMAIL = os.getenv("ALERT_FROM_EMAIL", "").strip()
+
+ALERT_TO_EMAILS_RAW = os.getenv("ALERT_TO_EMAILS", "").strip()
+if ALERT_TO_EMAILS_RAW == "":
+    ALERT_TO_EMAILS_RAW = os.getenv("ALERT_TO_EMAIL", "").strip()
+
+ALERT_TO_EMAILS = [e.strip() for e in ALERT_TO_EMAILS_RAW.split(",") if e.strip()]
+
+# Adds a compact HTML part (one collapsible section per alarm) to the email
+ALERT_EMAIL_HTML = os.getenv("ALERT_EMAIL_HTML", "0").strip() == "1"
+
+def _build_sendgrid_attachments(paths):
+    items = []
+    if paths is None:
+        return items
+
+    for path in paths:
+        if path is None:
+            continue
+        path = str(path).strip()
+        if path == "":
+            continue
+        if os.path.isfile(path) is False:
+            print("Attachment missing:", path)
+            continue
+
+        with open(path, "rb") as f:
+            b64 = base64.b64encode(f.read()).decode("utf-8")
+
+        items.append({
+            "content": b64,
+            "type": "text/csv",
+            "filename": os.path.basename(path),
+            "disposition": "attachment",
+        })
+
+    return items
+
+def send_sendgrid_email(subject, body_text, attach_paths=None, body_html=None):
+    if SENDGRID_API_KEY == "" or ALERT_FROM_EMAIL == "" or len(ALERT_TO_EMAILS) == 0:
+        print("Email skipped. Missing SendGrid configuration.")
+        return False
+
+    payload = {
+        "personalizations": [{"to": [{"email": e} for e in ALERT_TO_EMAILS]}],
+        "from": {"email": ALERT_FROM_EMAIL},
+        "subject": subject,
+        "content": [{"type": "text/plain", "value": body_text}],
+    }
+    if body_html:
+        payload["content"].append({"type": "text/html", "value": body_html})
+
+    attachments = _build_sendgrid_attachments(attach_paths)
+    if len(attachments) > 0:
+        payload["attachments"] = attachments
+
+    try:
+        r = post_notification(
+            "https://api.sendgrid.com/v3/mail/send",
+            payload,
+            headers={
+                "Authorization": f"Bearer {SENDGRID_API_KEY}",
+                "Content-Type": "application/json",
+            },
+        )
+
+        if r.status_code >= 400:
+            print(f"SendGrid failed {r.status_code}: {r.text[:800]}")
+            return False
+
+        print("SendGrid sent ok:", subject)
+        return True
+
+    except Exception as e:
+        print(f"SendGrid exception: {e}")
+        return False
+
+# --------------------------------------
+# NOTIFY STAGE (Discord + Email)
+# --------------------------------------
+
+def send_alerts(summary_run, diff_archive_run, run_time_str, files):
+    run = group_run(summary_run, diff_archive_run)
+    has_changed = len(run["by_flag"]["CHANGED"]) > 0
+    has_issue = len(run["by_flag"]["ERROR"]) + len(run["by_flag"]["BLOCKED"]) > 0
+
+    send_discord_webhook(DISCORD_WEBHOOK_URL_ALL, render_discord_all(run, run_time_str))
+
+    if has_changed:
+        send_discord_webhook(DISCORD_WEBHOOK_URL_CHANGED, render_discord_changed(run, run_time_str))
+
+    if has_issue:
+        send_discord_webhook(DISCORD_WEBHOOK_URL_ERROR, render_discord_issues(run, run_time_str))
+
+    # Email body: only the diff rows table
+    subject = f"URL Monitor Run {run_time_str}"
+    written = [files["diff_archive"], files["summary"], files["snapshot"]]
+    body = render_email_text(run, run_time_str, written)
+    body_html = render_email_html(run, run_time_str, written) if ALERT_EMAIL_HTML else None
+
+    # Attach CSV files too
+    attach_list = [p for p in (files["diff_archive"], files["summary"]) if os.path.isfile(p)]
+
+    send_sendgrid_email(subject, body, attach_paths=attach_list, body_html=body_html)
+    print("Email attempted for every run")
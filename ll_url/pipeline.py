@@ -0,0 +1,297 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import datetime
+
+from .budget import RUN_BUDGET_MINUTES, RUN_LOCK, RUN_MAX_RSS_MB, RunBudget, RunLock
+from .check import DEFAULT_STAGES, check_feed_alarm, compare_page, fetch_page
+from .checkpoint import RunJournal, load_incomplete_run, truncate_to
+from .feeds import FEED_STATE_JSON, SHEET_FEED_COLUMN, load_feed_state, save_feed_state
+from .fetch import get_session
+from .history import export_run
+from .linediff import load_snapshot_index, save_snapshot_index
+from .notify import send_alerts
+from .polling import RUN_TIME_FORMAT, load_poll_history, order_alarms, plan_polls
+from .records import CsvAppender, append_records, iter_records, latest_records, write_records
+
+# --------------------------------------
+# PIPELINE
+# --------------------------------------
+# source -> fetch -> extract -> fingerprint -> diff -> persist -> notify
+#
+# fetch + extract run on a thread pool, at most two pages per worker ahead
+# of the alarm being compared. Fingerprint, diff, the journal and persist
+# run on the calling thread in priority order, so the files keep a stable
+# row order and memory is bounded by the read-ahead window. Once the run
+# budget is spent no new alarm is started; the rest are flagged DEFERRED.
+
+SNAPSHOT_CSV = "snapshot_data.csv"
+SUMMARY_CSV = "Alarm_url_changes.csv"
+DIFF_ARCHIVE_CSV = "Alarm_url_diff_archive.csv"
+SUMMARY_HISTORY_CSV = "Alarm_url_history.csv"
+SNAPSHOT_INDEX_JSON = "snapshot_index.json"
+RUN_JOURNAL = "run_journal.jsonl"
+
+FILES = {
+    "snapshot": SNAPSHOT_CSV,
+    "summary": SUMMARY_CSV,
+    "diff_archive": DIFF_ARCHIVE_CSV,
+    "history": SUMMARY_HISTORY_CSV,
+    "snapshot_index": SNAPSHOT_INDEX_JSON,
+    "journal": RUN_JOURNAL,
+    "feed_state": FEED_STATE_JSON,
+    "lock": RUN_LOCK,
+}
+
+SNAPSHOT_COLUMNS = ["run_time", "alarm_name", "url", "content"]
+SUMMARY_COLUMNS = [
+    "run_time", "alarm_name", "url", "change_flag", "change_count",
+    "bytes_wire", "bytes_decoded", "diff_truncated"
+]
+DIFF_ARCHIVE_COLUMNS = [
+    "run_time", "alarm_name", "url",
+    "line_no", "before", "after",
+    "before_len", "after_len", "delta_len", "change_type"
+]
+
+# Concurrent page fetches. 1 fetches one page at a time.
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8") or 1)
+
+# Typed Parquet copy of each run under HISTORY_DATASET_DIR (needs pyarrow)
+HISTORY_EXPORT = os.getenv("HISTORY_EXPORT", "1").strip() != "0"
+
+# --------------------------------------
+# PERSIST STAGE
+# --------------------------------------
+
+def save_run(files, snapshot_run, summary_run, diff_writer):
+    # Snapshot and summary history grow; summary and diff archive hold
+    # this run and are replaced atomically. Diff rows were streamed to the
+    # partial file during the run.
+    append_records(files["snapshot"], snapshot_run, SNAPSHOT_COLUMNS)
+    append_records(files["history"], summary_run, SUMMARY_COLUMNS)
+    write_records(files["summary"], summary_run, SUMMARY_COLUMNS)
+    diff_writer.close()
+    os.replace(diff_writer.path, files["diff_archive"])
+
+# --------------------------------------
+# RUN
+# --------------------------------------
+
+class Pipeline:
+    # source() returns (alarms, urls, rule_engine). Stages left as None use
+    # DEFAULT_STAGES; persist and notify get the files dict first.
+    def __init__(self, source, fetch=None, extract=None, fingerprint=None, diff=None,
+                 persist=save_run, notify=send_alerts, files=None, workers=FETCH_WORKERS,
+                 history_export=HISTORY_EXPORT, budget_minutes=RUN_BUDGET_MINUTES, max_rss_mb=RUN_MAX_RSS_MB):
+        self.source = source
+        overrides = {"fetch": fetch, "extract": extract, "fingerprint": fingerprint, "diff": diff}
+        self.stages = {**DEFAULT_STAGES, **{k: v for k, v in overrides.items() if v is not None}}
+        self.persist = persist
+        self.notify = notify
+        self.files = {**FILES, **(files or {})}
+        self.workers = max(1, int(workers))
+        self.history_export = history_export
+        self.budget_minutes = budget_minutes
+        self.max_rss_mb = max_rss_mb
+
+    def pages(self, todo, rule_engine, budget=None):
+        # todo is [(alarm, url, prefetch)]. Yields (alarm, page, deferred) in
+        # order; page is None for alarms that are not prefetched. Waiting on
+        # a page never runs past the deadline. Once the budget is spent,
+        # deferred holds the reason for every alarm whose page is not
+        # already in hand: queued fetches are cancelled and running ones
+        # are not waited for.
+        ahead = self.workers * 2
+        get_session()
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        window = deque()
+        items = iter(todo)
+        stop = None
+        try:
+            while True:
+                if stop is None and budget is not None:
+                    stop = budget.exhausted()
+                while stop is None and len(window) <= ahead:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    alarm, url, prefetch = item
+                    future = None
+                    if prefetch:
+                        future = pool.submit(fetch_page, url, rule_engine.for_alarm(alarm), self.stages)
+                    window.append((alarm, future))
+
+                if len(window) == 0:
+                    for alarm, _, _ in items:
+                        yield alarm, None, stop
+                    return
+
+                alarm, future = window.popleft()
+                if stop is None and future is not None:
+                    try:
+                        future.result(timeout=budget.seconds_left() if budget is not None else None)
+                    except TimeoutError:
+                        stop = budget.exhausted() or f"run budget {budget.minutes:g} min spent"
+                if stop is not None and (future is None or future.done() is False):
+                    if future is not None:
+                        future.cancel()
+                    yield alarm, None, stop
+                else:
+                    yield alarm, (future.result() if future is not None else None), None
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, dry_run=False, resume=False, poll_all=False):
+        if dry_run:
+            return self._run(dry_run, resume, poll_all)
+        lock = RunLock(self.files["lock"])
+        if lock.acquire() is False:
+            return []
+        try:
+            return self._run(dry_run, resume, poll_all)
+        finally:
+            lock.release()
+
+    def _run(self, dry_run, resume, poll_all):
+        budget = RunBudget(self.budget_minutes, self.max_rss_mb)
+        files = self.files
+        diff_partial = files["diff_archive"] + ".partial"
+        alarms, urls, rule_engine = self.source()
+
+        run_time_str = None
+        done = {}
+        saved_sizes = {}
+        if resume:
+            run_time_str, done, saved_sizes = load_incomplete_run(files["journal"])
+            if run_time_str is None:
+                print("Nothing to resume. Starting a new run.")
+            else:
+                print(f"Resuming run {run_time_str}: {len(done)} alarms already done")
+                # Undo history appends that were cut off before "end"
+                truncate_to(files["snapshot"], saved_sizes.get("snapshot_size"))
+                truncate_to(files["history"], saved_sizes.get("history_size"))
+                # Diff rows of finished alarms are kept, partial ones dropped. If
+                # the save already moved the diff file into place, move it back.
+                if "snapshot_size" in saved_sizes and os.path.isfile(diff_partial) is False \
+                        and os.path.isfile(files["diff_archive"]):
+                    os.replace(files["diff_archive"], diff_partial)
+        elif dry_run is False:
+            # A plain run after a crash during save still rolls back the
+            # half-appended history rows; left in place they would become
+            # the previous version of each alarm
+            stale_run, _, stale_sizes = load_incomplete_run(files["journal"])
+            if "snapshot_size" in stale_sizes:
+                print(f"Rolling back the unfinished save of run {stale_run}")
+                truncate_to(files["snapshot"], stale_sizes.get("snapshot_size"))
+                truncate_to(files["history"], stale_sizes.get("history_size"))
+
+        resuming = run_time_str is not None
+        if resuming is False:
+            run_time_str = datetime.now().strftime(RUN_TIME_FORMAT)
+
+        # Adaptive polling: only alarms that are due this run get fetched
+        history = load_poll_history(files["history"])
+        due, not_due = plan_polls(alarms, history, datetime.strptime(run_time_str, RUN_TIME_FORMAT), force=poll_all)
+        due = set(due) | set(done)
+        for alarm, minutes_left in not_due:
+            if alarm not in due:
+                print(f"{alarm}: NOT_DUE (next poll in {minutes_left:.0f} min)")
+
+        # Only the latest snapshot per alarm is kept in memory
+        prev_snapshots = latest_records(files["snapshot"])
+        snapshot_index = load_snapshot_index(files["snapshot_index"])
+        feed_state = load_feed_state(files["feed_state"])
+
+        journal = None
+        diff_writer = None
+        if dry_run is False:
+            journal = RunJournal(files["journal"], run_time_str, resume=resuming)
+            diff_writer = CsvAppender(diff_partial, DIFF_ARCHIVE_COLUMNS, truncate_size=saved_sizes.get("diff_size"))
+        sink = diff_writer.write if diff_writer is not None else None
+
+        snapshot_run = []
+        summary_run = []
+        # Preview rows only; the full diff rows are already on disk
+        diff_archive_run = []
+
+        # Finished and feed alarms are not prefetched; feeds fetch their own pages
+        order = order_alarms([alarm for alarm in urls if alarm in due], alarms, history)
+        todo = [
+            (alarm, urls[alarm], alarm not in done and not (alarms.get(alarm) or {}).get(SHEET_FEED_COLUMN))
+            for alarm in order
+        ]
+        deferred = 0
+        for alarm, page, deferred_by in self.pages(todo, rule_engine, budget):
+            url = urls[alarm]
+            opts = alarms.get(alarm) or {}
+            if alarm in done:
+                result = done[alarm]
+            elif deferred_by is not None:
+                print(f"{alarm}: DEFERRED ({deferred_by})")
+                deferred += 1
+                result = {"summary": {
+                    "run_time": run_time_str,
+                    "alarm_name": alarm,
+                    "url": url,
+                    "change_flag": "DEFERRED",
+                    "change_count": deferred_by,
+                    "bytes_wire": 0,
+                    "bytes_decoded": 0,
+                }, "snapshot": None, "diffs": [], "index": None}
+            elif page is None:
+                result = check_feed_alarm(
+                    alarm, url, rule_engine.for_alarm(alarm), run_time_str, opts,
+                    feed_state.get(alarm), prev_snapshots, snapshot_index, sink=sink, stages=self.stages,
+                    budget=budget,
+                )
+            else:
+                prev_row = prev_snapshots.get(alarm)
+                prev_text = prev_row["content"] if prev_row is not None else None
+
+                result = compare_page(
+                    alarm, url, page, prev_text, run_time_str,
+                    opts=opts, prev_index=snapshot_index.get(alarm), sink=sink, stages=self.stages,
+                )
+            if journal is not None and alarm not in done:
+                journal.record(alarm, result, diff_size=diff_writer.tell())
+
+            summary_run.append(result["summary"])
+            for part in [result] + result.get("sub_results", []):
+                snap = part["snapshot"]
+                if snap is None:
+                    continue
+                snapshot_run.append(snap)
+                if part["index"] is not None:
+                    snapshot_index[snap["alarm_name"]] = part["index"]
+                else:
+                    snapshot_index.pop(snap["alarm_name"], None)
+            if "feed_state" in result:
+                feed_state[alarm] = result["feed_state"]
+            diff_archive_run.extend(result["diffs"])
+
+        if deferred:
+            print(f"Run budget: {deferred} alarms deferred to the next run after {budget.elapsed_minutes():.1f} min")
+
+        if dry_run:
+            diff_rows = sum(int(r.get("change_count") or 0) for r in summary_run if r["change_flag"] == "CHANGED")
+            print(f"Dry run: {len(summary_run)} alarms checked, {diff_rows} diff rows. No files written, no alerts sent.")
+            return summary_run
+
+        journal.saving(
+            os.path.getsize(files["snapshot"]) if os.path.isfile(files["snapshot"]) else 0,
+            os.path.getsize(files["history"]) if os.path.isfile(files["history"]) else 0,
+        )
+        self.persist(files, snapshot_run, summary_run, diff_writer)
+        save_snapshot_index(files["snapshot_index"], snapshot_index)
+        save_feed_state(feed_state, files["feed_state"])
+        journal.finish()
+
+        if self.history_export:
+            try:
+                export_run(summary_run, iter_records(files["diff_archive"]))
+            except Exception as e:
+                print("History export failed:", e)
+
+        self.notify(summary_run, diff_archive_run, run_time_str, files)
+        return summary_run
@@ -0,0 +1,149 @@
+import math
+import os
+from collections import deque
+from datetime import datetime
+
+from .records import iter_records
+
+# --------------------------------------
+# ADAPTIVE POLLING
+# --------------------------------------
+# Each alarm's change rate is estimated from its recent summary history
+# and turned into a poll interval. Pages that change often are polled on
+# every run, static pages back off towards POLL_MAX_MINUTES.
+
+POLL_MIN_MINUTES = float(os.getenv("POLL_MIN_MINUTES", "15") or 15)
+POLL_MAX_MINUTES = float(os.getenv("POLL_MAX_MINUTES", str(7 * 24 * 60)) or 7 * 24 * 60)
+
+# Interval is chosen so a poll finds a change with this probability
+POLL_TARGET_CHANGE_PROB = 0.5
+
+# Alarms with less history than this are polled on every run
+POLL_MIN_OBSERVATIONS = 5
+
+# Only the most recent polls count, so the rate follows the page over time
+POLL_HISTORY_WINDOW = 60
+
+# Pseudo-count of changes assumed over the observed span, so a page with
+# no detected change gets a finite rate instead of jumping to the maximum
+POLL_PRIOR_CHANGES = 0.5
+
+# The interval never exceeds this multiple of the history span observed
+POLL_MAX_SPAN_MULTIPLE = 2.0
+
+# Cron start times jitter; an alarm this close to due is polled now
+POLL_SLACK_MINUTES = 2
+
+# Per-alarm sheet column with a fixed interval in minutes
+SHEET_POLL_COLUMN = "poll_minutes"
+
+# Per-alarm sheet column: lower runs first. A number or high / normal / low.
+SHEET_PRIORITY_COLUMN = "priority"
+PRIORITY_WORDS = {"high": 1, "normal": 5, "low": 9}
+DEFAULT_PRIORITY = 5
+
+RUN_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+OBSERVED_FLAGS = {"CHANGED", "MINOR_CHANGE", "NO_CHANGE", "FIRST_RUN"}
+CHANGE_FLAGS = {"CHANGED", "MINOR_CHANGE"}
+
+def _parse_time(s):
+    try:
+        return datetime.strptime(str(s), RUN_TIME_FORMAT)
+    except ValueError:
+        return None
+
+def load_poll_history(path, window=POLL_HISTORY_WINDOW) -> dict:
+    # {alarm: {"polls": deque[(time, changed)], "last_attempt": time, "last_flag": str}}
+    history = {}
+    for row in iter_records(path):
+        t = _parse_time(row.get("run_time"))
+        if t is None:
+            continue
+        h = history.setdefault(row.get("alarm_name", ""), {
+            "polls": deque(maxlen=window),
+            "last_attempt": None,
+            "last_flag": "",
+        })
+        h["last_attempt"] = t
+        h["last_flag"] = row.get("change_flag", "")
+        if h["last_flag"] in OBSERVED_FLAGS:
+            h["polls"].append((t, h["last_flag"] in CHANGE_FLAGS))
+    return history
+
+def estimate_change_rate(polls):
+    # Changes per hour, or None without enough history. A poll only tells
+    # whether something changed since the previous one, so the naive
+    # changes/time undercounts busy pages. This uses the Cho and
+    # Garcia-Molina estimator: rate = -ln((n - X + 0.5) / (n + 0.5)) / I
+    # for n polls at mean interval I with X detected changes. It is never
+    # below POLL_PRIOR_CHANGES per observed span, which X = 0 would give.
+    polls = list(polls)
+    n = len(polls) - 1
+    if n < POLL_MIN_OBSERVATIONS:
+        return None
+    hours = (polls[-1][0] - polls[0][0]).total_seconds() / 3600.0
+    if hours <= 0:
+        return None
+    changes = sum(1 for _, changed in polls[1:] if changed)
+    mean_interval = hours / n
+    rate = -math.log((n - changes + 0.5) / (n + 0.5)) / mean_interval
+    return max(rate, POLL_PRIOR_CHANGES / hours)
+
+def poll_interval_minutes(stats, override=None):
+    if override not in (None, ""):
+        try:
+            return max(0.0, float(override))
+        except ValueError:
+            pass
+
+    if stats is None:
+        return POLL_MIN_MINUTES
+    rate = estimate_change_rate(stats["polls"])
+    if rate is None:
+        return 0.0
+
+    minutes = -math.log(1.0 - POLL_TARGET_CHANGE_PROB) / rate * 60.0
+    span = (stats["polls"][-1][0] - stats["polls"][0][0]).total_seconds() / 60.0
+    minutes = min(minutes, POLL_MAX_SPAN_MULTIPLE * span)
+    return min(POLL_MAX_MINUTES, max(POLL_MIN_MINUTES, minutes))
+
+def plan_polls(alarm_options, history, now, force=False):
+    # Returns (due, not_due) where not_due is a list of (alarm, minutes left)
+    due = []
+    not_due = []
+    for alarm, opts in alarm_options.items():
+        stats = history.get(alarm)
+        if force or stats is None or stats["last_attempt"] is None:
+            due.append(alarm)
+            continue
+        # Errors and blocks are retried on the next run
+        if stats["last_flag"] not in OBSERVED_FLAGS:
+            due.append(alarm)
+            continue
+
+        interval = poll_interval_minutes(stats, (opts or {}).get(SHEET_POLL_COLUMN))
+        elapsed = (now - stats["last_attempt"]).total_seconds() / 60.0
+        if elapsed + POLL_SLACK_MINUTES >= interval:
+            due.append(alarm)
+        else:
+            not_due.append((alarm, interval - elapsed))
+    return due, not_due
+
+def alarm_priority(opts):
+    value = str((opts or {}).get(SHEET_PRIORITY_COLUMN) or "").strip().lower()
+    if value in PRIORITY_WORDS:
+        return PRIORITY_WORDS[value]
+    try:
+        return float(value)
+    except ValueError:
+        return DEFAULT_PRIORITY
+
+def order_alarms(alarms, alarm_options, history):
+    # Alarms deferred by the last run go first, then by priority, then in
+    # sheet order
+    def key(item):
+        i, alarm = item
+        deferred = (history.get(alarm) or {}).get("last_flag") == "DEFERRED"
+        return (not deferred, alarm_priority(alarm_options.get(alarm)), i)
+    return [alarm for _, alarm in sorted(enumerate(alarms), key=key)]
@@ -0,0 +1,102 @@
+import csv
+import os
+import sys
+
+# --------------------------------------
+# LIGHTWEIGHT CSV RECORD STORAGE
+# --------------------------------------
+# Plain csv module storage for the monitoring hot path so a run does not
+# need pandas. Records are dicts; values read back are strings.
+
+# Snapshot content can be a whole page in one field
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+def iter_records(path):
+    if os.path.isfile(path) is False:
+        return
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield {k: ("" if v is None else v) for k, v in row.items()}
+
+def read_records(path) -> list:
+    return list(iter_records(path))
+
+def latest_records(path, key="alarm_name") -> dict:
+    # Streams the file and keeps only the last row per key
+    latest = {}
+    for row in iter_records(path):
+        latest[row.get(key, "")] = row
+    return latest
+
+def _header(path):
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), None)
+
+def write_records(path, records, columns):
+    # Written to a temp file and swapped in, so readers never see a half
+    # written file and a crash leaves the previous version in place
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        w.writeheader()
+        for r in records:
+            w.writerow(r)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def append_records(path, records, columns):
+    # Appends rows, writing the header for a new or empty file. If the
+    # existing header is different the file keeps its own column order.
+    exists = os.path.isfile(path) and os.path.getsize(path) > 0
+    if exists:
+        columns = _header(path) or columns
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        if exists is False:
+            w.writeheader()
+        for r in records:
+            w.writerow(r)
+
+class CsvAppender:
+    # Keeps one file open and appends rows as they are produced, for output
+    # that should not be collected in memory first. An existing file is cut
+    # back to truncate_size (a previous tell()) or started fresh.
+    def __init__(self, path, columns, truncate_size=None):
+        self.path = path
+        self.columns = list(columns)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if truncate_size is not None and os.path.isfile(path):
+            with open(path, "r+b") as f:
+                size = os.path.getsize(path)
+                if truncate_size > size:
+                    # Lost its tail in an OS crash: growing the file would
+                    # pad it with NUL bytes, so cut back to the last whole row
+                    print(f"{path} is shorter than journaled ({size} < {truncate_size} bytes)")
+                    f.seek(max(0, size - 65536))
+                    tail = f.read()
+                    truncate_size = size - len(tail) + tail.rfind(b"\n") + 1 if b"\n" in tail else 0
+                f.truncate(truncate_size)
+            self._f = open(path, "a", newline="", encoding="utf-8")
+        else:
+            self._f = open(path, "w", newline="", encoding="utf-8")
+        self._w = csv.DictWriter(self._f, fieldnames=self.columns, extrasaction="ignore")
+        if self._f.tell() == 0:
+            self._w.writeheader()
+
+    def write(self, row):
+        self._w.writerow(row)
+
+    def tell(self) -> int:
+        # Synced, so a size written to the journal is on disk as well
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        if self._f.closed is False:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
@@ -0,0 +1,143 @@
+import html
+
+# --------------------------------------
+# ALERT RENDERING
+# --------------------------------------
+# Discord messages and email bodies are built from the run's in-memory
+# summary rows and preview diff rows. group_run() walks them once; the
+# renderers only touch the rows they print, so cost follows what is shown
+# rather than how many alarms or diff rows the run produced.
+
+FLAGS = ["CHANGED", "MINOR_CHANGE", "ERROR", "BLOCKED", "NO_CHANGE", "FIRST_RUN", "DEFERRED"]
+
+EMAIL_COLUMNS = [
+    "run_time", "alarm_name", "url",
+    "line_no", "before", "after",
+    "before_len", "after_len", "delta_len", "change_type"
+]
+
+CLIP_CHARS = 180
+
+def safe_url(u: str) -> str:
+    u = str(u or "")
+    return u.replace("https://", "hxxps://").replace("http://", "hxxp://")
+
+def group_run(summary_run, diff_rows):
+    by_flag = {f: [] for f in FLAGS}
+    bytes_wire = 0
+    bytes_decoded = 0
+    for r in summary_run:
+        by_flag.setdefault(r["change_flag"], []).append(r)
+        bytes_wire += int(r.get("bytes_wire") or 0)
+        bytes_decoded += int(r.get("bytes_decoded") or 0)
+
+    changed = {r["alarm_name"] for r in by_flag["CHANGED"]}
+    diffs = {}
+    for d in diff_rows:
+        if len(changed) == 0 or d["alarm_name"] in changed:
+            diffs.setdefault(d["alarm_name"], []).append(d)
+
+    return {
+        "by_flag": by_flag,
+        "diffs": diffs,
+        "bytes_wire": bytes_wire,
+        "bytes_decoded": bytes_decoded,
+    }
+
+def _clip(s, n=CLIP_CHARS):
+    return ("" if s is None else str(s))[:n].replace("\r", " ").replace("\n", " | ")
+
+def _shown_rows(run, max_rows):
+    # Rows in alarm order, line order within an alarm, up to max_rows
+    out = []
+    for alarm in sorted(run["diffs"]):
+        for d in run["diffs"][alarm]:
+            if len(out) >= max_rows:
+                return out
+            out.append(d)
+    return out
+
+# --------------------------------------
+# DISCORD
+# --------------------------------------
+
+def render_discord_all(run, run_time_str):
+    n = {f: len(rows) for f, rows in run["by_flag"].items()}
+    return "\n".join([
+        f"RUN {run_time_str}",
+        f"Changed {n['CHANGED']} | Minor {n['MINOR_CHANGE']} | Errors {n['ERROR']} | Blocked {n['BLOCKED']} | No change {n['NO_CHANGE']} | First {n['FIRST_RUN']} | Deferred {n['DEFERRED']}",
+        f"Transfer {run['bytes_wire'] / 1e6:.2f} MB wire | {run['bytes_decoded'] / 1e6:.2f} MB decoded",
+    ])
+
+def render_discord_changed(run, run_time_str):
+    lines = [f"CHANGED {run_time_str}", ""]
+    lines.extend(
+        f"- {r['alarm_name']} changes={r['change_count']} url={safe_url(r['url'])}"
+        for r in run["by_flag"]["CHANGED"]
+    )
+    return "\n".join(lines)
+
+def render_discord_issues(run, run_time_str):
+    lines = [f"ISSUES {run_time_str}", ""]
+    lines.extend(
+        f"- {r['alarm_name']} blocked={r['change_count']} url={safe_url(r['url'])}"
+        for r in run["by_flag"]["BLOCKED"]
+    )
+    lines.extend(
+        f"- {r['alarm_name']} error={r['change_count']} url={safe_url(r['url'])}"
+        for r in run["by_flag"]["ERROR"]
+    )
+    return "\n".join(lines)
+
+# --------------------------------------
+# EMAIL
+# --------------------------------------
+
+def render_email_text(run, run_time_str, files, max_rows=300):
+    footer = ["", "Files written:"] + [f"- {f}" for f in files]
+    rows = _shown_rows(run, max_rows)
+    if len(rows) == 0:
+        return "\n".join([f"Run time: {run_time_str}", "", "No diff rows this run."] + footer)
+
+    table = [[_clip(r.get(c)) for c in EMAIL_COLUMNS] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in table)) for i, c in enumerate(EMAIL_COLUMNS)]
+    lines = [f"Run time: {run_time_str}", "", "DIFF ROWS"]
+    lines.append(" ".join(c.rjust(w) for c, w in zip(EMAIL_COLUMNS, widths)))
+    lines.extend(" ".join(v.rjust(w) for v, w in zip(row, widths)) for row in table)
+    return "\n".join(lines + footer)
+
+def render_email_html(run, run_time_str, files, max_rows=300):
+    # Compact body: counts, then one collapsible section per changed alarm
+    e = html.escape
+    n = {f: len(rows) for f, rows in run["by_flag"].items()}
+    parts = [
+        "<html><body style=\"font-family:sans-serif;font-size:13px\">",
+        f"<h3>URL Monitor Run {e(run_time_str)}</h3>",
+        "<p>" + " | ".join(f"{e(f)} {n.get(f, 0)}" for f in FLAGS) + "</p>",
+    ]
+
+    shown = 0
+    for alarm in sorted(run["diffs"]):
+        rows = run["diffs"][alarm]
+        take = rows[:max(0, max_rows - shown)]
+        shown += len(take)
+        url = e(safe_url(rows[0].get("url", ""))) if rows else ""
+        parts.append(f"<details><summary><b>{e(alarm)}</b> {len(rows)} rows <small>{url}</small></summary>")
+        parts.append("<table border=\"1\" cellspacing=\"0\" cellpadding=\"3\"><tr><th>line</th><th>before</th><th>after</th></tr>")
+        parts.extend(
+            f"<tr><td>{e(str(r.get('line_no', '')))}</td><td>{e(_clip(r.get('before')))}</td><td>{e(_clip(r.get('after')))}</td></tr>"
+            for r in take
+        )
+        parts.append("</table></details>")
+
+    issues = run["by_flag"]["ERROR"] + run["by_flag"]["BLOCKED"]
+    if issues:
+        parts.append("<details><summary><b>Issues</b> " + str(len(issues)) + "</summary><ul>")
+        parts.extend(
+            f"<li>{e(r['alarm_name'])} {e(r['change_flag'])}: {e(_clip(r['change_count']))}</li>"
+            for r in issues
+        )
+        parts.append("</ul></details>")
+
+    parts.append("<p>Files written: " + ", ".join(e(f) for f in files) + "</p></body></html>")
+    return "\n".join(parts)
@@ -0,0 +1,275 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+# --------------------------------------
+# RECORD / REPLAY HTTP
+# --------------------------------------
+# record: the monitor talks to the real sites and every GET response (status,
+#         content type, decoded body) is saved to a fixture archive:
+#           <fixture dir>/index.json          url -> status, type, body file
+#           <fixture dir>/bodies/<key>.bin
+# replay: every request is rewritten to a local server that answers from
+#         the archive, with optional latency, injected 403 / 429 / 5xx and
+#         content mutations. Notifications go to an outbox file instead of
+#         Discord / SendGrid.
+# A "#copy-N" fragment on a URL replays the same fixture as a separate page,
+# which is how load tests turn a few recorded sites into thousands.
+
+REPLAY_LATENCY_MS = float(os.getenv("REPLAY_LATENCY_MS", "0") or 0)
+REPLAY_JITTER_MS = float(os.getenv("REPLAY_JITTER_MS", "0") or 0)
+REPLAY_FAIL_RATE = float(os.getenv("REPLAY_FAIL_RATE", "0") or 0)
+REPLAY_FAIL_STATUSES = [
+    int(s) for s in (os.getenv("REPLAY_FAIL_STATUSES", "403,429,503") or "403,429,503").split(",") if s.strip()
+]
+REPLAY_MUTATE_RATE = float(os.getenv("REPLAY_MUTATE_RATE", "0") or 0)
+REPLAY_SEED = os.getenv("REPLAY_SEED", "0").strip() or "0"
+
+REPLAY_OUTBOX_JSONL = "replay_outbox.jsonl"
+
+# Bodies at least this big are sent gzip encoded when the client accepts it
+REPLAY_GZIP_MIN_BYTES = 1024
+
+MUTABLE_TYPES = ("text/html", "text/plain", "application/xhtml+xml")
+
+def split_copy(url):
+    base, _, frag = str(url).partition("#")
+    copy = frag[5:] if frag.startswith("copy-") else "0"
+    return base, copy
+
+def fixture_key(url) -> str:
+    base, _ = split_copy(url)
+    return hashlib.blake2b(base.encode("utf-8"), digest_size=10).hexdigest()
+
+# --------------------------------------
+# FIXTURE ARCHIVE
+# --------------------------------------
+
+class FixtureStore:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self.index = {}
+        path = os.path.join(root, "index.json")
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        self._by_key = {v["key"]: url for url, v in self.index.items()}
+
+    def urls(self):
+        return list(self.index)
+
+    def get(self, key):
+        # Returns (entry, body bytes) or (None, None)
+        url = self._by_key.get(key)
+        if url is None:
+            return None, None
+        entry = self.index[url]
+        body = self._bodies.get(key)
+        if body is None:
+            with open(os.path.join(self.root, "bodies", entry["body"]), "rb") as f:
+                body = f.read()
+            self._bodies[key] = body
+        return entry, body
+
+    def put(self, url, status, content_type, body):
+        base, _ = split_copy(url)
+        key = fixture_key(base)
+        os.makedirs(os.path.join(self.root, "bodies"), exist_ok=True)
+        with self._lock:
+            name = key + ".bin"
+            with open(os.path.join(self.root, "bodies", name), "wb") as f:
+                f.write(body)
+            self.index[base] = {
+                "key": key,
+                "status": int(status),
+                "content_type": content_type or "",
+                "body": name,
+                "recorded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._by_key[key] = base
+            self._bodies.pop(key, None)
+            tmp = os.path.join(self.root, "index.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, os.path.join(self.root, "index.json"))
+
+class RecordingSession(requests.Session):
+    # Reads each GET body in full before handing the response back; the
+    # caller's streaming read then iterates the cached body. The decode
+    # budget in read_body still applies, but only after the download, so
+    # record against sites you trust.
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def request(self, method, url, *args, **kwargs):
+        resp = super().request(method, url, *args, **kwargs)
+        if method.upper() == "GET":
+            self.store.put(url, resp.status_code, resp.headers.get("Content-Type", ""), resp.content)
+            print("Recorded:", resp.status_code, url)
+        return resp
+
+# --------------------------------------
+# REPLAY SERVER
+# --------------------------------------
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The client drops connections on purpose (403 before the archive
+        # fallback, bodies over the decode budget)
+        pass
+
+class ReplayServer:
+    def __init__(self, store, latency_ms=REPLAY_LATENCY_MS, jitter_ms=REPLAY_JITTER_MS,
+                 fail_rate=REPLAY_FAIL_RATE, fail_statuses=None, mutate_rate=REPLAY_MUTATE_RATE,
+                 seed=REPLAY_SEED):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.fail_statuses = list(fail_statuses or REPLAY_FAIL_STATUSES)
+        self.mutate_rate = mutate_rate
+        self.seed = str(seed)
+        # Bumped between load test runs so mutations differ run to run
+        self.epoch = 0
+        self.stats = {"requests": 0, "served": 0, "missing": 0, "mutated": 0, "bytes_sent": 0, "faults": {}}
+        self._attempts = {}
+        self._gzipped = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+        self.base_url = ""
+
+    def _roll(self, *parts) -> float:
+        # Deterministic in [0, 1) for the same seed, page, attempt and epoch,
+        # whatever order the requests arrive in
+        raw = "|".join([self.seed] + [str(p) for p in parts]).encode("utf-8")
+        return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big") / 2**64
+
+    def local_url(self, url) -> str:
+        _, copy = split_copy(url)
+        return f"{self.base_url}/{fixture_key(url)}/{copy}"
+
+    def respond(self, key, copy, accept_encoding=""):
+        # Returns (status, headers, body)
+        with self._lock:
+            self.stats["requests"] += 1
+            n = self._attempts.get((key, copy, self.epoch), 0)
+            self._attempts[(key, copy, self.epoch)] = n + 1
+            epoch = self.epoch
+
+        delay = self.latency_ms + self.jitter_ms * self._roll(key, copy, epoch, n, "jitter")
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if self.fail_statuses and self._roll(key, copy, epoch, n, "fail") < self.fail_rate:
+            status = self.fail_statuses[int(self._roll(key, copy, epoch, n, "status") * len(self.fail_statuses))]
+            with self._lock:
+                self.stats["faults"][status] = self.stats["faults"].get(status, 0) + 1
+            return status, {"Content-Type": "text/plain"}, f"replay fault {status}".encode("utf-8")
+
+        entry, body = self.store.get(key)
+        if entry is None:
+            with self._lock:
+                self.stats["missing"] += 1
+            return 404, {"Content-Type": "text/plain"}, b"no fixture recorded for this url"
+
+        headers = {"Content-Type": entry["content_type"]}
+        mutated = False
+        if entry["content_type"].split(";")[0].strip().lower() in MUTABLE_TYPES \
+                and self._roll(key, copy, epoch, "mutate") < self.mutate_rate:
+            marker = f"<p>replay change {epoch}-{copy}</p>".encode("utf-8")
+            cut = body.rfind(b"</body>")
+            body = body[:cut] + marker + body[cut:] if cut >= 0 else body + b"\n" + marker
+            mutated = True
+
+        if "gzip" in (accept_encoding or "") and len(body) >= REPLAY_GZIP_MIN_BYTES:
+            if mutated:
+                body = gzip.compress(body, 6)
+            else:
+                if key not in self._gzipped:
+                    self._gzipped[key] = gzip.compress(body, 6)
+                body = self._gzipped[key]
+            headers["Content-Encoding"] = "gzip"
+
+        with self._lock:
+            self.stats["served"] += 1
+            self.stats["mutated"] += int(mutated)
+            self.stats["bytes_sent"] += len(body)
+        return entry["status"], headers, body
+
+    def start(self, host="127.0.0.1", port=0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                key = parts[0]
+                copy = parts[1] if len(parts) > 1 else "0"
+                status, headers, body = server.respond(key, copy, self.headers.get("Accept-Encoding", ""))
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = _QuietHTTPServer((host, port), Handler)
+        self.base_url = f"http://{host}:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        print(f"Replay server on {self.base_url} with {len(self.store.urls())} fixtures")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+class ReplaySession(requests.Session):
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, self.server.local_url(url), *args, **kwargs)
+
+# --------------------------------------
+# NOTIFICATION OUTBOX
+# --------------------------------------
+
+def outbox_post(url, payload, path=REPLAY_OUTBOX_JSONL):
+    # Stands in for the Discord / SendGrid POST. Only the host is written
+    # (Discord webhook URLs carry their token in the path, SendGrid headers
+    # the API key) and attachments are reduced to their names.
+    payload = dict(payload or {})
+    if "attachments" in payload:
+        payload["attachments"] = [a.get("filename") for a in payload["attachments"]]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "host": urlparse(url).netloc,
+            "payload": payload,
+        }, ensure_ascii=False) + "\n")
+
+    resp = requests.Response()
+    resp.status_code = 202
+    resp._content = b""
+    resp.url = url
+    return resp
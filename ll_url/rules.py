@@ -0,0 +1,248 @@
+import json
+import os
+import re
+
+# --------------------------------------
+# DEFAULT RULES
+# --------------------------------------
+# Plain entries are literal phrases matched case-insensitively on word
+# boundaries. Entries starting with "re:" are raw regular expressions.
+# In per-alarm lists an entry starting with "-" removes a global rule.
+
+RULES_JSON = os.getenv("URL_RULES_JSON", "url_rules.json").strip()
+
+# Block detection only looks at the page title and this many characters of
+# normalized text. Gates sit at the top of the page; articles that merely
+# mention "forbidden" further down are not blocked pages.
+BLOCK_SCAN_CHARS = 2000
+
+DEFAULT_BLOCK_RULES = [
+    "log in to continue",
+    "for full account access",
+    "please log in",
+    "access denied",
+    "request blocked",
+    "forbidden",
+    "verify you are human",
+    "captcha",
+    "checking your browser",
+    "just a moment",
+    "enable cookies",
+    "unusual traffic",
+    "temporarily unavailable",
+]
+
+DEFAULT_NOISE_RULES = [
+    "log in to continue",
+    "please",
+    "log in",
+    "for full account access",
+    "cookie",
+    "accept all",
+    "accept cookies",
+    "manage cookies",
+    "privacy policy",
+    "terms of use",
+    "skip to content",
+    "javascript",
+    "your browser",
+    "subscribe",
+    "sign in",
+    "register",
+]
+
+# Sheet columns holding per-alarm rules, separated by ";" or newlines
+SHEET_BLOCK_COLUMN = "block_rules"
+SHEET_NOISE_COLUMN = "noise_rules"
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", flags=re.IGNORECASE | re.DOTALL)
+_WORD_CHAR_RE = re.compile(r"\w")
+
+# --------------------------------------
+# COMPILER
+# --------------------------------------
+
+def _trie_to_regex(node):
+    end = "" in node
+    branches = [
+        re.escape(ch) + _trie_to_regex(child)
+        for ch, child in sorted(node.items())
+        if ch != ""
+    ]
+    if len(branches) == 0:
+        return ""
+    if len(branches) == 1 and end is False:
+        return branches[0]
+    body = "(?:" + "|".join(branches) + ")"
+    return body + "?" if end else body
+
+def _literal_pattern(phrases):
+    # Literal phrases are merged into one prefix tree so the regex engine
+    # tries each text position against a single trie walk instead of one
+    # alternative per rule. Cost stays linear in the text as rules grow.
+    # A word boundary is only required on a side that starts or ends with
+    # a word character, so "c++" or "(beta)" still match; phrases are
+    # grouped into one tree per pair of sides.
+    tries = {}
+    for p in phrases:
+        sides = (_WORD_CHAR_RE.match(p[0]) is not None, _WORD_CHAR_RE.match(p[-1]) is not None)
+        node = tries.setdefault(sides, {})
+        for ch in p:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return "|".join(
+        (r"\b" if left else "") + _trie_to_regex(trie) + (r"\b" if right else "")
+        for (left, right), trie in sorted(tries.items(), reverse=True)
+    )
+
+def compile_rules(rules, owner="global"):
+    # A "re:" rule that does not compile is reported and skipped so one
+    # typo in the sheet cannot stop the run
+    literals = []
+    regexes = []
+    for rule in rules:
+        if rule.startswith("re:"):
+            try:
+                # Compiled as it sits in the merged pattern, which also
+                # rejects inline flags that only work at the start
+                re.compile(f"x|(?:{rule[3:]})")
+            except re.error as e:
+                print(f"Rule skipped for {owner}: {rule!r} ({e.msg})")
+                continue
+            regexes.append(rule[3:])
+        elif rule.strip():
+            literals.append(rule.lower())
+
+    parts = []
+    if literals:
+        parts.append(_literal_pattern(sorted(set(literals))))
+    parts.extend(f"(?:{r})" for r in regexes)
+    if len(parts) == 0:
+        return None
+    return re.compile("|".join(parts), flags=re.IGNORECASE)
+
+def merge_rules(base, overrides):
+    merged = list(base)
+    for rule in overrides:
+        rule = rule.strip()
+        if rule == "":
+            continue
+        if rule.startswith("-"):
+            drop = rule[1:].strip().lower()
+            merged = [r for r in merged if r.lower() != drop]
+        elif rule.lower() not in {r.lower() for r in merged}:
+            merged.append(rule)
+    return merged
+
+def split_rule_cell(value):
+    return [r.strip() for r in re.split(r"[;\n]", str(value or "")) if r.strip()]
+
+def page_title(raw_text, limit=65536):
+    m = _TITLE_RE.search((raw_text or "")[:limit])
+    if m is None:
+        return ""
+    return " ".join(m.group(1).split())
+
+# --------------------------------------
+# RULE SETS
+# --------------------------------------
+
+class RuleSet:
+    def __init__(self, block_rules, noise_rules, block_scan_chars=BLOCK_SCAN_CHARS, owner="global"):
+        self.block_rules = list(block_rules)
+        self.noise_rules = list(noise_rules)
+        self.block_scan_chars = int(block_scan_chars)
+        self._block_re = compile_rules(self.block_rules, owner)
+        self._noise_re = compile_rules(self.noise_rules, owner)
+
+    def blocked_by(self, text, title=""):
+        t = (text or "").strip()
+        if t == "":
+            return "EMPTY_PAGE"
+        if self._block_re is None:
+            return None
+        for scope in (title or "", t[:self.block_scan_chars]):
+            m = self._block_re.search(scope)
+            if m is not None:
+                return m.group(0)
+        return None
+
+    def is_blocked(self, text, title=""):
+        return self.blocked_by(text, title) is not None
+
+    def is_noise(self, line):
+        return self._noise_re is not None and self._noise_re.search(line) is not None
+
+    def strip_noise(self, text):
+        keep = []
+        for l in (text or "").splitlines():
+            l = l.strip()
+            if len(l) <= 1:
+                continue
+            if self.is_noise(l):
+                continue
+            keep.append(l)
+        return "\n".join(keep)
+
+class RuleEngine:
+    def __init__(self, block_rules=None, noise_rules=None, block_scan_chars=BLOCK_SCAN_CHARS, alarms=None):
+        self.block_rules = list(DEFAULT_BLOCK_RULES if block_rules is None else block_rules)
+        self.noise_rules = list(DEFAULT_NOISE_RULES if noise_rules is None else noise_rules)
+        self.block_scan_chars = int(block_scan_chars)
+        self.alarms = dict(alarms or {})
+        self._global = RuleSet(self.block_rules, self.noise_rules, self.block_scan_chars)
+        self._cache = {}
+
+    def set_alarm_rules(self, alarm, block=None, noise=None, block_scan_chars=None):
+        cfg = self.alarms.setdefault(alarm, {})
+        if block:
+            cfg["block"] = list(cfg.get("block", [])) + list(block)
+        if noise:
+            cfg["noise"] = list(cfg.get("noise", [])) + list(noise)
+        if block_scan_chars is not None:
+            cfg["block_scan_chars"] = int(block_scan_chars)
+        self._cache.pop(alarm, None)
+
+    def for_alarm(self, alarm=None):
+        if alarm is None or alarm not in self.alarms:
+            return self._global
+        if alarm not in self._cache:
+            cfg = self.alarms[alarm]
+            self._cache[alarm] = RuleSet(
+                merge_rules(self.block_rules, cfg.get("block", [])),
+                merge_rules(self.noise_rules, cfg.get("noise", [])),
+                cfg.get("block_scan_chars", self.block_scan_chars),
+                owner=alarm,
+            )
+        return self._cache[alarm]
+
+# --------------------------------------
+# LOADING
+# --------------------------------------
+
+def load_rule_engine(path=RULES_JSON, alarm_options=None):
+    # Global rules come from the JSON file when present, otherwise the
+    # defaults above. Per-alarm rules come from the file "alarms" section
+    # and the block_rules / noise_rules sheet columns.
+    cfg = {}
+    if path and os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        print("Loaded rules from", path)
+
+    engine = RuleEngine(
+        block_rules=cfg.get("block"),
+        noise_rules=cfg.get("noise"),
+        block_scan_chars=cfg.get("block_scan_chars", BLOCK_SCAN_CHARS),
+    )
+
+    for alarm, a in (cfg.get("alarms") or {}).items():
+        engine.set_alarm_rules(alarm, a.get("block"), a.get("noise"), a.get("block_scan_chars"))
+
+    for alarm, opts in (alarm_options or {}).items():
+        block = split_rule_cell(opts.get(SHEET_BLOCK_COLUMN))
+        noise = split_rule_cell(opts.get(SHEET_NOISE_COLUMN))
+        if block or noise:
+            engine.set_alarm_rules(alarm, block, noise)
+
+    return engine
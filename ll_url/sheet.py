@@ -0,0 +1,59 @@
+import csv
+from io import StringIO
+
+from .fetch import get_session
+
+# --------------------------------------
+# URL GUARD
+# --------------------------------------
+
+def validate_urls(urls: dict):
+    bad = []
+    for name, url in urls.items():
+        u = (url or "").lower()
+        if "urldefense.com" in u or "ct.sendgrid.net/ls/click" in u:
+            bad.append((name, url))
+    if bad:
+        print("BAD URLS FOUND. Replace with the real website URLs:")
+        for name, url in bad:
+            print(" -", name, url)
+        raise SystemExit(2)
+
+# --------------------------------------
+# LOAD URLS FROM PUBLIC GOOGLE SHEET
+# --------------------------------------
+
+def load_alarms_from_google_sheet(csv_url: str) -> dict:
+    r = get_session().get(csv_url, headers={"Accept": "text/csv,*/*"}, timeout=30)
+    r.raise_for_status()
+
+    ct = (r.headers.get("Content-Type") or "").lower()
+    if "text/html" in ct:
+        raise ValueError("Google Sheet returned HTML. Set sharing to Anyone with the link, Viewer.")
+
+    reader = csv.DictReader(StringIO(r.text))
+    columns = [str(c).strip() for c in (reader.fieldnames or [])]
+    reader.fieldnames = columns
+    required = {"Alarm", "url"}
+    missing = [c for c in required if c not in set(columns)]
+    if missing:
+        raise ValueError(f"Sheet missing columns: {missing}. Needed: Alarm, url")
+
+    # Extra sheet columns (block_rules, noise_rules, ...) are per-alarm options
+    alarms = {}
+    for raw in reader:
+        row = {c: str(raw.get(c) or "").strip() for c in columns}
+        if row["Alarm"] == "" or row["url"] == "":
+            continue
+        # Duplicates: keep the last row, in the position of the last row
+        alarms.pop(row["Alarm"], None)
+        alarms[row["Alarm"]] = row
+
+    if len(alarms) == 0:
+        raise ValueError("Sheet returned zero rows after cleanup")
+
+    return alarms
+
+def load_urls_from_google_sheet(csv_url: str) -> dict:
+    alarms = load_alarms_from_google_sheet(csv_url)
+    return {name: opts["url"] for name, opts in alarms.items()}
@@ -1,21 +1,20 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-# In[17]:
+import os
+import sys
+import argparse
 
+from ll_url import FILES, Pipeline
+from ll_url.fetch import reset_session, start_replay
+from ll_url.history import export_csv_history, history_report
+from ll_url.polling import estimate_change_rate, load_poll_history, poll_interval_minutes
+from ll_url.rules import load_rule_engine
+from ll_url.sheet import load_alarms_from_google_sheet, validate_urls
 
-import os
-import json
-import difflib
-import base64
-import re
-from datetime import datetime
-from io import StringIO
-
-import requests
-from requests.adapters import HTTPAdapter, Retry
-from bs4 import BeautifulSoup
-import pandas as pd
+# Sheet driven configuration of the ll_url pipeline. Engine settings (diff
+# mode, limits, HTTP mode, alert channels) are environment variables read
+# by the ll_url modules. pandas is only imported by the report command.
 
 # --------------------------------------
 # CONFIG
@@ -25,623 +24,186 @@ SHEET_ID = "1aXZ06m5r9voN0tU9Ip6VUtr7BYiYaqTZuwZsUYeMKvo"
 SHEET_NAME = "LIVe"
 SHEET_CSV_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/gviz/tq?tqx=out:csv&sheet={SHEET_NAME}"
 
-SNAPSHOT_CSV = "snapshot_data.csv"
-SUMMARY_CSV = "Alarm_url_changes.csv"
-DIFF_ARCHIVE_CSV = "Alarm_url_diff_archive.csv"
-
-TIMEOUT = 30
-
-DEFAULT_HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/120.0.0.0 Safari/537.36"
-    ),
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Cache-Control": "no-cache",
-    "Pragma": "no-cache",
-    "Connection": "keep-alive",
-}
-
-os.makedirs(os.path.dirname(SNAPSHOT_CSV) or ".", exist_ok=True)
-
-# --------------------------------------
-# BLOCK + NOISE FILTERS
-# --------------------------------------
-
-BLOCK_PAGE_PATTERNS = [
-    r"\blog in to continue\b",
-    r"\bfor full account access\b",
-    r"\bplease log in\b",
-    r"\baccess denied\b",
-    r"\brequest blocked\b",
-    r"\bforbidden\b",
-    r"\bverify you are human\b",
-    r"\bcaptcha\b",
-    r"\bchecking your browser\b",
-    r"\bjust a moment\b",
-    r"\benable cookies\b",
-    r"\bunusual traffic\b",
-    r"\btemporarily unavailable\b",
-]
-
-NOISE_LINE_PATTERNS = [
-    r"\blog in to continue\b",
-    r"\bplease\b",
-    r"\blog in\b",
-    r"\bfor full account access\b",
-    r"\bcookie\b",
-    r"\baccept all\b",
-    r"\baccept cookies\b",
-    r"\bmanage cookies\b",
-    r"\bprivacy policy\b",
-    r"\bterms of use\b",
-    r"\bskip to content\b",
-    r"\bjavascript\b",
-    r"\byour browser\b",
-    r"\bsubscribe\b",
-    r"\bsign in\b",
-    r"\bregister\b",
-]
-
-_BLOCK_RE = re.compile("|".join(BLOCK_PAGE_PATTERNS), flags=re.IGNORECASE)
-_NOISE_RE = re.compile("|".join(NOISE_LINE_PATTERNS), flags=re.IGNORECASE)
-
-def is_blocked_page(text: str) -> bool:
-    t = (text or "").strip()
-    if t == "":
-        return True
-    if _BLOCK_RE.search(t):
-        return True
-    return False
-
-def strip_noise_lines(text: str) -> str:
-    lines = [l.strip() for l in (text or "").splitlines()]
-    keep = []
-    for l in lines:
-        if l == "":
-            continue
-        if len(l) <= 1:
-            continue
-        if _NOISE_RE.search(l):
-            continue
-        keep.append(l)
-    return "\n".join(keep)
-
-# --------------------------------------
-# URL GUARD
-# --------------------------------------
-
-def validate_urls(urls: dict):
-    bad = []
-    for name, url in urls.items():
-        u = (url or "").lower()
-        if "urldefense.com" in u or "ct.sendgrid.net/ls/click" in u:
-            bad.append((name, url))
-    if bad:
-        print("BAD URLS FOUND. Replace with the real website URLs:")
-        for name, url in bad:
-            print(" -", name, url)
-        raise SystemExit(2)
-
 # --------------------------------------
-# LOAD URLS FROM PUBLIC GOOGLE SHEET
+# SOURCE STAGE
 # --------------------------------------
 
-def load_urls_from_google_sheet(csv_url: str) -> dict:
-    r = requests.get(csv_url, timeout=30)
-    r.raise_for_status()
-
-    ct = (r.headers.get("Content-Type") or "").lower()
-    if "text/html" in ct:
-        raise ValueError("Google Sheet returned HTML. Set sharing to Anyone with the link, Viewer.")
-
-    df = pd.read_csv(StringIO(r.text))
-
-    df.columns = [str(c).strip() for c in df.columns]
-    required = {"Alarm", "url"}
-    missing = [c for c in required if c not in set(df.columns)]
-    if missing:
-        raise ValueError(f"Sheet missing columns: {missing}. Needed: Alarm, url")
-
-    df["Alarm"] = df["Alarm"].astype(str).str.strip()
-    df["url"] = df["url"].astype(str).str.strip()
-
-    df = df[(df["Alarm"] != "") & (df["url"] != "")]
-    df = df.drop_duplicates(subset=["Alarm"], keep="last")
-
-    urls = dict(zip(df["Alarm"].tolist(), df["url"].tolist()))
-    if len(urls) == 0:
-        raise ValueError("Sheet returned zero rows after cleanup")
+def load_run_config():
+    alarms = load_alarms_from_google_sheet(SHEET_CSV_URL)
+    urls = {name: opts["url"] for name, opts in alarms.items()}
+    print(f"Loaded {len(urls)} URLs from Google Sheet tab {SHEET_NAME}")
 
-    return urls
+    validate_urls(urls)
 
-URLS = load_urls_from_google_sheet(SHEET_CSV_URL)
-print(f"Loaded {len(URLS)} URLs from Google Sheet tab {SHEET_NAME}")
+    rule_engine = load_rule_engine(alarm_options=alarms)
+    return alarms, urls, rule_engine
 
-validate_urls(URLS)
+def run_monitor(dry_run=False, resume=False, poll_all=False):
+    return Pipeline(load_run_config).run(dry_run=dry_run, resume=resume, poll_all=poll_all)
 
 # --------------------------------------
-# DISCORD ALERTS (3 channels via 3 webhooks)
+# LOAD TEST (replay mode)
 # --------------------------------------
 
-DISCORD_WEBHOOK_URL_ALL = os.getenv("DISCORD_WEBHOOK_URL_ALL", "").strip()
-DISCORD_WEBHOOK_URL_CHANGED = os.getenv("DISCORD_WEBHOOK_URL_CHANGED", "").strip()
-DISCORD_WEBHOOK_URL_ERROR = os.getenv("DISCORD_WEBHOOK_URL_ERROR", "").strip()
-
-def send_discord_webhook(webhook_url: str, message: str) -> bool:
-    if webhook_url == "":
-        print("Discord skipped. Webhook missing.")
-        return False
-
-    payload = {"content": message[:1900]}
-    try:
-        r = requests.post(webhook_url, json=payload, timeout=30)
-        print("Discord status:", r.status_code)
-        if r.status_code >= 400:
-            print("Discord failed:", r.text[:800])
-            return False
-        print("Discord sent ok")
-        return True
-    except Exception as e:
-        print("Discord exception:", e)
-        return False
-
-def safe_url(u: str) -> str:
-    u = str(u or "")
-    return u.replace("https://", "hxxps://").replace("http://", "hxxp://")
-
-def build_discord_all_message(df_summary_run, run_time_str):
-    changed = df_summary_run[df_summary_run["change_flag"] == "CHANGED"]
-    errored = df_summary_run[df_summary_run["change_flag"] == "ERROR"]
-    blocked = df_summary_run[df_summary_run["change_flag"] == "BLOCKED"]
-    nochange = df_summary_run[df_summary_run["change_flag"] == "NO_CHANGE"]
-    first = df_summary_run[df_summary_run["change_flag"] == "FIRST_RUN"]
+def run_loadtest(copies=10, runs=2, latency_ms=0.0, jitter_ms=0.0, fail_rate=0.0,
+                 mutate_rate=0.2, seed="0", workdir=None):
+    # Replays the recorded sheet and pages with every alarm repeated
+    # `copies` times, in a scratch directory so the real history is not
+    # touched. Each run after the first sees a share of pages mutated.
+    import tempfile
+    import time
 
-    lines = []
-    lines.append(f"RUN {run_time_str}")
-    lines.append(
-        f"Changed {len(changed)} | Errors {len(errored)} | Blocked {len(blocked)} | No change {len(nochange)} | First {len(first)}"
+    server = start_replay(
+        latency_ms=latency_ms, jitter_ms=jitter_ms, fail_rate=fail_rate,
+        mutate_rate=mutate_rate, seed=seed,
     )
-    return "\n".join(lines)
-
-def build_discord_changed_message(df_summary_run, run_time_str):
-    changed = df_summary_run[df_summary_run["change_flag"] == "CHANGED"]
-    lines = [f"CHANGED {run_time_str}", ""]
-    for _, row in changed.iterrows():
-        lines.append(f"- {row['alarm_name']} changes={row['change_count']} url={safe_url(row['url'])}")
-    return "\n".join(lines)
-
-def build_discord_error_message(df_summary_run, run_time_str):
-    errored = df_summary_run[df_summary_run["change_flag"] == "ERROR"]
-    blocked = df_summary_run[df_summary_run["change_flag"] == "BLOCKED"]
-    lines = [f"ISSUES {run_time_str}", ""]
-
-    for _, row in blocked.iterrows():
-        lines.append(f"- {row['alarm_name']} blocked={row['change_count']} url={safe_url(row['url'])}")
 
-    for _, row in errored.iterrows():
-        lines.append(f"- {row['alarm_name']} error={row['change_count']} url={safe_url(row['url'])}")
-
-    return "\n".join(lines)
-
-# --------------------------------------
-# EMAIL ALERTS (SendGrid) with CSV attachment
-# --------------------------------------
-
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", "").strip()
-ALERT_FROM_EMAIL = os.getenv("ALERT_FROM_EMAIL", "").strip()
-
-ALERT_TO_EMAILS_RAW = os.getenv("ALERT_TO_EMAILS", "").strip()
-if ALERT_TO_EMAILS_RAW == "":
-    ALERT_TO_EMAILS_RAW = os.getenv("ALERT_TO_EMAIL", "").strip()
-
-ALERT_TO_EMAILS = [e.strip() for e in ALERT_TO_EMAILS_RAW.split(",") if e.strip()]
-
-def _build_sendgrid_attachments(paths):
-    items = []
-    if paths is None:
-        return items
-
-    for path in paths:
-        if path is None:
-            continue
-        path = str(path).strip()
-        if path == "":
-            continue
-        if os.path.isfile(path) is False:
-            print("Attachment missing:", path)
-            continue
-
-        with open(path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode("utf-8")
-
-        items.append({
-            "content": b64,
-            "type": "text/csv",
-            "filename": os.path.basename(path),
-            "disposition": "attachment",
-        })
-
-    return items
-
-def send_sendgrid_email(subject, body_text, attach_paths=None):
-    if SENDGRID_API_KEY == "" or ALERT_FROM_EMAIL == "" or len(ALERT_TO_EMAILS) == 0:
-        print("Email skipped. Missing SendGrid configuration.")
-        return False
-
-    payload = {
-        "personalizations": [{"to": [{"email": e} for e in ALERT_TO_EMAILS]}],
-        "from": {"email": ALERT_FROM_EMAIL},
-        "subject": subject,
-        "content": [{"type": "text/plain", "value": body_text}],
-    }
-
-    attachments = _build_sendgrid_attachments(attach_paths)
-    if len(attachments) > 0:
-        payload["attachments"] = attachments
-
-    try:
-        r = requests.post(
-            "https://api.sendgrid.com/v3/mail/send",
-            headers={
-                "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json=payload,
-            timeout=30,
+    # The sheet is read once, without injected faults
+    server.fail_rate = 0.0
+    base_alarms, _, _ = load_run_config()
+    server.fail_rate = fail_rate
+
+    alarms = {}
+    for i in range(copies):
+        for name, opts in base_alarms.items():
+            alarms[f"{name}#{i}"] = {**opts, "Alarm": f"{name}#{i}", "url": f"{opts['url']}#copy-{i}"}
+    urls = {name: opts["url"] for name, opts in alarms.items()}
+    config = (alarms, urls, load_rule_engine(alarm_options=alarms))
+
+    workdir = workdir or tempfile.mkdtemp(prefix="url_loadtest_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    print(f"Load test: {len(urls)} alarms x {runs} runs in {workdir}")
+
+    for epoch in range(runs):
+        server.epoch = epoch
+        before = dict(server.stats, faults=dict(server.stats["faults"]))
+        t0 = time.perf_counter()
+        summary_run = Pipeline(lambda: config).run(poll_all=True)
+        elapsed = time.perf_counter() - t0
+
+        flags = {}
+        for r in summary_run:
+            flags[r["change_flag"]] = flags.get(r["change_flag"], 0) + 1
+        stats = server.stats
+        faults = {k: v - before["faults"].get(k, 0) for k, v in stats["faults"].items()}
+        print(f"LOAD RUN {epoch + 1}: {len(summary_run)} alarms in {elapsed:.1f}s ({len(summary_run) / max(elapsed, 1e-9):.1f}/s)")
+        print(f"  flags {flags}")
+        print(
+            f"  requests {stats['requests'] - before['requests']} | faults {faults} | "
+            f"mutated {stats['mutated'] - before['mutated']} | missing {stats['missing'] - before['missing']} | "
+            f"{(stats['bytes_sent'] - before['bytes_sent']) / 1e6:.2f} MB sent"
         )
 
-        if r.status_code >= 400:
-            print(f"SendGrid failed {r.status_code}: {r.text[:800]}")
-            return False
-
-        print("SendGrid sent ok:", subject)
-        return True
-
-    except Exception as e:
-        print(f"SendGrid exception: {e}")
-        return False
-
-def build_email_body(df_summary_run, df_diff_archive_run, run_time_str, max_rows=300):
-    # Email body shows only the diff table, matching your CSV columns
-
-    changed_alarms = df_summary_run[df_summary_run["change_flag"] == "CHANGED"]["alarm_name"].tolist()
-    if len(changed_alarms) > 0:
-        df_show = df_diff_archive_run[df_diff_archive_run["alarm_name"].isin(changed_alarms)].copy()
-    else:
-        df_show = df_diff_archive_run.copy()
-
-    cols = [
-        "run_time", "alarm_name", "url",
-        "line_no", "before", "after",
-        "before_len", "after_len", "delta_len"
-    ]
-
-    if df_show.empty:
-        return "\n".join([
-            f"Run time: {run_time_str}",
-            "",
-            "No diff rows this run.",
-            "",
-            "Files written:",
-            f"- {DIFF_ARCHIVE_CSV}",
-            f"- {SUMMARY_CSV}",
-            f"- {SNAPSHOT_CSV}",
-        ])
-
-    df_show = df_show.sort_values(["alarm_name", "line_no"]).head(max_rows)
-
-    def _clip(s, n):
-        s = "" if s is None else str(s)
-        return s[:n]
-
-    df_show["before"] = df_show["before"].apply(lambda x: _clip(x, 180))
-    df_show["after"] = df_show["after"].apply(lambda x: _clip(x, 180))
-
-    lines = []
-    lines.append(f"Run time: {run_time_str}")
-    lines.append("")
-    lines.append("DIFF ROWS")
-    lines.append(df_show[cols].to_string(index=False, max_colwidth=200))
-    lines.append("")
-    lines.append("Files written:")
-    lines.append(f"- {DIFF_ARCHIVE_CSV}")
-    lines.append(f"- {SUMMARY_CSV}")
-    lines.append(f"- {SNAPSHOT_CSV}")
-    return "\n".join(lines)
+    reset_session()
+    return workdir
 
 # --------------------------------------
-# HTTP SESSION
+# REPORT
 # --------------------------------------
 
-def build_session():
-    s = requests.Session()
-    s.headers.update(DEFAULT_HEADERS)
-    retries = Retry(
-        total=3,
-        connect=3,
-        read=3,
-        backoff_factor=1.5,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET"],
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retries, pool_connections=20, pool_maxsize=20)
-    s.mount("http://", adapter)
-    s.mount("https://", adapter)
-    return s
-
-session = build_session()
+def build_report(summary_path=FILES["summary"], snapshot_path=FILES["snapshot"], history_path=FILES["history"]):
+    import pandas as pd
 
-# --------------------------------------
-# HELPERS
-# --------------------------------------
-
-def normalize_content(raw_text):
-    raw_text = (raw_text or "").strip()
-
-    # JSON input normalization
-    try:
-        obj = json.loads(raw_text)
-        if isinstance(obj, (dict, list)):
-            raw_text = json.dumps(obj, ensure_ascii=False, sort_keys=True)
-    except Exception:
-        pass
-
-    soup = BeautifulSoup(raw_text, "html.parser")
-
-    for tag in soup(["script", "style", "noscript"]):
-        tag.extract()
-
-    text = soup.get_text("\n")
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    cleaned = "\n".join(lines)
-
-    cleaned = strip_noise_lines(cleaned)
-
-    cleaned_lines = [l.strip() for l in cleaned.splitlines() if l.strip()]
-    return "\n".join(cleaned_lines)
-
-def diff_to_rows(before, after, max_field_len=4000):
-    rows = []
-    before_lines = (before or "").splitlines()
-    after_lines = (after or "").splitlines()
-
-    line_no = 0
-    before_buf = None
-
-    for d in difflib.ndiff(before_lines, after_lines):
-        code = d[0]
-        text = d[2:]
-
-        if code == " ":
-            line_no += 1
-            before_buf = None
-        elif code == "-":
-            before_buf = text
-        elif code == "+":
-            b = before_buf or ""
-            rows.append({
-                "line_no": line_no,
-                "before": b[:max_field_len],
-                "after": text[:max_field_len],
-                "before_len": len(b),
-                "after_len": len(text),
-                "delta_len": len(text) - len(b),
-            })
-            before_buf = None
-
-    return rows
-
-def archive_url(url: str) -> str:
-    return "https://web.archive.org/web/0/" + url
-
-def fetch_text(url):
-    resp = session.get(url, timeout=TIMEOUT)
-
-    if resp.status_code == 403:
-        print("403 blocked. Trying archive:", url)
-        ar = requests.get(archive_url(url), headers=DEFAULT_HEADERS, timeout=TIMEOUT)
-        ar.raise_for_status()
-        return ar.text
-
-    resp.raise_for_status()
-    return resp.text
-
-# --------------------------------------
-# DATAFRAMES
-# --------------------------------------
-
-df_snapshot = pd.DataFrame(columns=["run_time", "alarm_name", "url", "content"])
-df_summary = pd.DataFrame(columns=["run_time", "alarm_name", "url", "change_flag", "change_count"])
-
-df_diff_archive = pd.DataFrame(columns=[
-    "run_time", "alarm_name", "url",
-    "line_no", "before", "after",
-    "before_len", "after_len", "delta_len"
-])
+    lines = []
 
-if os.path.isfile(SNAPSHOT_CSV):
-    df_snapshot = pd.read_csv(SNAPSHOT_CSV)
+    if os.path.isfile(summary_path):
+        df_summary = pd.read_csv(summary_path, dtype=str, keep_default_na=False)
+        lines.append("LAST RUN")
+        lines.append(df_summary.groupby("change_flag").size().to_string())
+        lines.append("")
+
+    if os.path.isfile(snapshot_path):
+        df_snap = pd.read_csv(snapshot_path, usecols=["run_time", "alarm_name", "content"], dtype=str, keep_default_na=False)
+        df_snap["content_id"] = pd.factorize(df_snap["content"])[0]
+        df_snap = df_snap.drop(columns=["content"]).sort_values(["alarm_name", "run_time"])
+        prev_id = df_snap.groupby("alarm_name")["content_id"].shift()
+        df_snap["changed"] = prev_id.notna() & (prev_id != df_snap["content_id"])
+
+        last_change = df_snap[df_snap["changed"]].groupby("alarm_name")["run_time"].max()
+        df_report = df_snap.groupby("alarm_name").agg(
+            snapshots=("run_time", "size"),
+            changes=("changed", "sum"),
+            first_seen=("run_time", "min"),
+            last_seen=("run_time", "max"),
+        )
+        df_report["last_change"] = last_change
+        df_report["last_change"] = df_report["last_change"].fillna("")
+        lines.append("SNAPSHOT HISTORY")
+        lines.append(df_report.to_string())
+        lines.append("")
+
+    history = load_poll_history(history_path)
+    if history:
+        df_poll = pd.DataFrame([{
+            "alarm_name": alarm,
+            "polls": len(h["polls"]),
+            "changes_per_day": (estimate_change_rate(h["polls"]) or 0.0) * 24,
+            "interval_min": poll_interval_minutes(h),
+            "last_flag": h["last_flag"],
+        } for alarm, h in sorted(history.items())]).set_index("alarm_name")
+        lines.append("POLL SCHEDULE (sheet poll_minutes overrides not applied)")
+        lines.append(df_poll.round(2).to_string())
+
+    if len(lines) == 0:
+        return "No history files found."
+    return "\n".join(lines)
 
 # --------------------------------------
-# MAIN LOOP
-# --------------------------------------
-
-run_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-for alarm, url in URLS.items():
-    try:
-        raw_text = fetch_text(url)
-        current_norm = normalize_content(raw_text)
-
-        # If blocked, skip snapshot and diff
-        if is_blocked_page(current_norm):
-            df_summary = pd.concat(
-                [df_summary, pd.DataFrame([{
-                    "run_time": run_time_str,
-                    "alarm_name": alarm,
-                    "url": url,
-                    "change_flag": "BLOCKED",
-                    "change_count": "LOGIN_OR_BOT_GATE",
-                }])],
-                ignore_index=True,
-            )
-            print(f"{alarm}: BLOCKED (snapshot skipped)")
-            continue
-
-        prev_row = df_snapshot[df_snapshot["alarm_name"] == alarm].tail(1)
-        prev_text = None
-        if prev_row.empty is False:
-            prev_text = prev_row["content"].values[0]
-
-        if prev_text is None:
-            change_flag = "FIRST_RUN"
-            change_count = 0
-            changes = []
+# CLI
+# --------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="URL change monitor")
+    sub = parser.add_subparsers(dest="command")
+    p_run = sub.add_parser("run", help="check every alarm, save files and send alerts (default)")
+    p_run.add_argument("--resume", action="store_true", help="continue an interrupted run from the run journal")
+    p_run.add_argument("--all", dest="poll_all", action="store_true", help="poll every alarm, ignoring the adaptive schedule")
+    p_dry = sub.add_parser("dry-run", help="check alarms without writing files or sending alerts")
+    p_dry.add_argument("--all", dest="poll_all", action="store_true", help="poll every alarm, ignoring the adaptive schedule")
+    p_report = sub.add_parser("report", help="summarize the saved history files")
+    p_report.add_argument("--history", action="store_true", help="aggregate the Parquet history instead of the CSV files")
+    p_report.add_argument("--since", help="first run date, YYYY-MM-DD (with --history)")
+    p_report.add_argument("--until", help="last run date, YYYY-MM-DD (with --history)")
+    sub.add_parser("export", help="backfill runs missing from the Parquet history from the CSV files")
+    p_load = sub.add_parser("loadtest", help="replay recorded fixtures (HTTP_FIXTURE_DIR) as many simulated alarms")
+    p_load.add_argument("--copies", type=int, default=10, help="times each recorded alarm is repeated")
+    p_load.add_argument("--runs", type=int, default=2, help="monitor runs to time")
+    p_load.add_argument("--latency-ms", type=float, default=0.0, help="added latency per request")
+    p_load.add_argument("--jitter-ms", type=float, default=0.0, help="random extra latency per request, up to this")
+    p_load.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered 403 / 429 / 503")
+    p_load.add_argument("--mutate-rate", type=float, default=0.2, help="share of pages changed on each run")
+    p_load.add_argument("--seed", default="0", help="seed for faults and mutations")
+    p_load.add_argument("--workdir", help="directory for the run files (default: a new temp directory)")
+    args = parser.parse_args(argv)
+
+    command = args.command or "run"
+
+    if command == "report":
+        if args.history:
+            print(history_report(args.since, args.until))
         else:
-            if str(prev_text) != str(current_norm):
-                changes = diff_to_rows(str(prev_text), str(current_norm))
-                change_flag = "CHANGED"
-                change_count = len(changes)
-            else:
-                change_flag = "NO_CHANGE"
-                change_count = 0
-                changes = []
-
-        df_snapshot = pd.concat(
-            [df_snapshot, pd.DataFrame([{
-                "run_time": run_time_str,
-                "alarm_name": alarm,
-                "url": url,
-                "content": str(current_norm),
-            }])],
-            ignore_index=True,
-        )
+            print(build_report())
+        return 0
 
-        df_summary = pd.concat(
-            [df_summary, pd.DataFrame([{
-                "run_time": run_time_str,
-                "alarm_name": alarm,
-                "url": url,
-                "change_flag": change_flag,
-                "change_count": change_count,
-            }])],
-            ignore_index=True,
+    if command == "loadtest":
+        run_loadtest(
+            copies=args.copies, runs=args.runs, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+            fail_rate=args.fail_rate, mutate_rate=args.mutate_rate, seed=args.seed, workdir=args.workdir,
         )
+        return 0
 
-        if len(changes) > 0:
-            df_diff_archive = pd.concat(
-                [df_diff_archive, pd.DataFrame([{
-                    "run_time": run_time_str,
-                    "alarm_name": alarm,
-                    "url": url,
-                    "line_no": c["line_no"],
-                    "before": c["before"],
-                    "after": c["after"],
-                    "before_len": c["before_len"],
-                    "after_len": c["after_len"],
-                    "delta_len": c["delta_len"],
-                } for c in changes])],
-                ignore_index=True,
-            )
-
-        print(f"{alarm}: {change_flag} ({change_count})")
-
-    except Exception as e:
-        df_summary = pd.concat(
-            [df_summary, pd.DataFrame([{
-                "run_time": run_time_str,
-                "alarm_name": alarm,
-                "url": url,
-                "change_flag": "ERROR",
-                "change_count": str(e),
-            }])],
-            ignore_index=True,
-        )
-        print(f"{alarm}: ERROR {e}")
-
-# --------------------------------------
-# SAVE FILES
-# --------------------------------------
-
-df_snapshot.to_csv(SNAPSHOT_CSV, index=False)
-df_summary.to_csv(SUMMARY_CSV, index=False)
-df_diff_archive.to_csv(DIFF_ARCHIVE_CSV, index=False)
-
-# --------------------------------------
-# SEND ALERTS (Discord + Email)
-# --------------------------------------
-
-df_summary_run = df_summary[df_summary["run_time"] == run_time_str]
-df_diff_archive_run = df_diff_archive[df_diff_archive["run_time"] == run_time_str]
-
-has_changed = (df_summary_run["change_flag"] == "CHANGED").any()
-has_issue = ((df_summary_run["change_flag"] == "ERROR") | (df_summary_run["change_flag"] == "BLOCKED")).any()
-
-send_discord_webhook(DISCORD_WEBHOOK_URL_ALL, build_discord_all_message(df_summary_run, run_time_str))
-
-if has_changed:
-    send_discord_webhook(DISCORD_WEBHOOK_URL_CHANGED, build_discord_changed_message(df_summary_run, run_time_str))
-
-if has_issue:
-    send_discord_webhook(DISCORD_WEBHOOK_URL_ERROR, build_discord_error_message(df_summary_run, run_time_str))
-
-# Email body: only the diff rows table
-subject = f"URL Monitor Run {run_time_str}"
-body = build_email_body(df_summary_run, df_diff_archive_run, run_time_str)
-
-# Attach CSV files too
-attach_list = []
-if os.path.isfile(DIFF_ARCHIVE_CSV):
-    attach_list.append(DIFF_ARCHIVE_CSV)
-if os.path.isfile(SUMMARY_CSV):
-    attach_list.append(SUMMARY_CSV)
-
-send_sendgrid_email(subject, body, attach_paths=attach_list)
-print("Email attempted for every run")
-
-
-# In[16]:
-
-
-df_snapshot
-
-
-# In[ ]:
-
-
-
-
-
-# In[ ]:
-
-
-
-
-
-# In[ ]:
-
-
-
-
-
-# In[ ]:
-
-
-
-
-
-# In[ ]:
-
-
-
-
-
-# In[11]:
-
-
+    if command == "export":
+        written = export_csv_history(FILES["history"], FILES["diff_archive"])
+        print(f"Wrote {len(written)} Parquet files")
+        return 0
 
+    run_monitor(
+        dry_run=(command == "dry-run"),
+        resume=getattr(args, "resume", False),
+        poll_all=getattr(args, "poll_all", False),
+    )
+    return 0
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ll_url.check import compare_page
+from ll_url.diffing import line_diff
+from ll_url.linediff import build_line_index, incremental_diff_rows, text_hash
+
+def rows(before, after, **kwargs):
+    out, _ = incremental_diff_rows("\n".join(before), "\n".join(after), **kwargs)
+    return [(r["line_no"], r["before"], r["after"], r["change_type"]) for r in out]
+
+# --------------------------------------
+# PREFIX / SUFFIX
+# --------------------------------------
+
+def test_identical_pages_have_no_rows():
+    assert rows(list("abcdef"), list("abcdef")) == []
+
+def test_edit_between_common_prefix_and_suffix():
+    assert rows(list("abcdef"), list("abXdef")) == [(2, "c", "X", "edit")]
+
+def test_insert_keeps_line_numbers_of_prefix():
+    assert rows(list("abcdef"), list("abcdXYef")) == [(4, "", "X", "edit"), (4, "", "Y", "edit")]
+
+def test_deletion_alone_has_no_rows():
+    assert rows(list("abcdef"), list("abef")) == []
+
+def test_change_at_both_ends():
+    assert rows(list("abcd"), list("Xbc")) == [(0, "a", "X", "edit")]
+
+def test_returns_hashes_of_new_version():
+    _, hashes = incremental_diff_rows("a\nb", "a\nc")
+    assert hashes == build_line_index(["a", "c"])
+
+# --------------------------------------
+# ANCHORS + MOVED BLOCKS
+# --------------------------------------
+
+def test_moved_block_is_one_row():
+    before = ["head", "m1", "m2", "m3", "x", "y", "z", "tail"]
+    after = ["head", "x", "y", "z", "m1", "m2", "m3", "tail"]
+    assert rows(before, after) == [(1, "[moved from line 5, 3 lines]", "x\ny\nz", "moved")]
+
+def test_moved_block_and_edit():
+    before = ["head", "m1", "m2", "m3", "x", "y", "z", "mid", "tail"]
+    after = ["head", "x", "y", "z", "m1", "m2", "m3", "MID", "tail"]
+    assert rows(before, after) == [
+        (1, "[moved from line 5, 3 lines]", "x\ny\nz", "moved"),
+        (4, "mid", "MID", "edit"),
+    ]
+
+# --------------------------------------
+# DUPLICATE LINES
+# --------------------------------------
+
+def test_duplicate_only_region_edit():
+    assert rows(["x", "x", "x", "x"], ["x", "y", "x", "x"]) == [(1, "x", "y", "edit")]
+
+def test_duplicate_only_region_insert():
+    assert rows(["x", "x"], ["x", "x", "x"]) == [(2, "", "x", "edit")]
+
+def test_duplicate_lines_between_anchors():
+    before = ["", "-", "", "item", "-", "", "item"]
+    after = ["", "-", "new", "item", "-", "", "item", "-"]
+    assert [(r[1], r[2]) for r in rows(before, after)] == [("", "new"), ("", "-")]
+
+# --------------------------------------
+# STORED INDEX
+# --------------------------------------
+
+def test_stale_index_of_same_length_is_rebuilt():
+    before = list("abcd")
+    stale = build_line_index(list("abzd"))
+    expected = rows(before, list("abcE"))
+    assert rows(before, list("abcE"), before_hashes=stale) == expected
+    assert rows(before, list("abcE"), before_hashes=stale, before_text_hash=text_hash("a\nb\nz\nd")) == expected
+    assert [r for r in expected if r[1] == r[2]] == []
+
+def test_matching_index_is_used():
+    before = "a\nb\nc"
+    good = build_line_index(before.splitlines())
+    out, _ = incremental_diff_rows(before, "a\nX\nc", before_hashes=good, before_text_hash=text_hash(before))
+    assert [(r["before"], r["after"]) for r in out] == [("b", "X")]
+
+def test_line_diff_passes_text_hash():
+    before = "a\nb\nc\nd"
+    prev_index = {"line_hashes": build_line_index(list("abzd")), "text_hash": text_hash("a\nb\nz\nd")}
+    out, _ = line_diff(before, "a\nb\nc\nE", prev_index, "incremental")
+    assert [(r["before"], r["after"]) for r in out] == [("d", "E")]
+
+def test_no_change_rebuilds_stale_index():
+    page = {"text": "a\nb\nc", "blocked_by": None, "error": None, "stats": {"bytes_wire": 0, "bytes_decoded": 0}}
+    stale = {"line_hashes": build_line_index(list("abz")), "text_hash": text_hash("a\nb\nz")}
+    result = compare_page("A", "u", page, "a\nb\nc", "2026-01-01 00:00:00",
+                          opts={"diff_mode": "incremental"}, prev_index=stale)
+    assert result["summary"]["change_flag"] == "NO_CHANGE"
+    assert result["index"]["line_hashes"] == build_line_index(list("abc"))
+    assert result["index"]["text_hash"] == text_hash("a\nb\nc")
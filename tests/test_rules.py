@@ -0,0 +1,76 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ll_url.rules import RuleEngine, compile_rules, load_rule_engine
+
+def matches(rules, text):
+    pattern = compile_rules(rules)
+    m = pattern.search(text) if pattern is not None else None
+    return m.group(0) if m is not None else None
+
+# --------------------------------------
+# LITERALS + WORD BOUNDARIES
+# --------------------------------------
+
+def test_literals_match_whole_words_only():
+    assert matches(["forbidden"], "403 Forbidden!") == "Forbidden"
+    assert matches(["forbidden"], "forbiddenx") is None
+    assert matches(["log in"], "login") is None
+
+def test_literals_sharing_a_prefix():
+    rules = ["log in", "log in to continue", "login"]
+    assert matches(rules, "please log in to continue") == "log in to continue"
+    assert matches(rules, "login here") == "login"
+    assert matches(rules, "log into") is None
+
+def test_literal_ending_with_punctuation():
+    assert matches(["c++"], "we use C++ here") == "C++"
+    assert matches(["c++"], "abc++") is None
+
+def test_literal_starting_and_ending_with_punctuation():
+    assert matches(["(beta)"], "release (BETA) now") == "(BETA)"
+    assert matches(["(beta)"], "release beta now") is None
+
+def test_mixed_groups_in_one_pattern():
+    rules = ["c++", "(beta)", "forbidden", "re:foo\\d"]
+    assert matches(rules, "x (beta)") == "(beta)"
+    assert matches(rules, "x c++") == "c++"
+    assert matches(rules, "x forbidden") == "forbidden"
+    assert matches(rules, "x foo7") == "foo7"
+
+def test_blank_literals_are_ignored():
+    assert compile_rules(["", "  "]) is None
+
+# --------------------------------------
+# INVALID REGEX RULES
+# --------------------------------------
+
+def test_invalid_regex_is_skipped(capsys):
+    pattern = compile_rules(["re:price (", "re:ok\\d", "cookie"], "A")
+    assert "Rule skipped for A" in capsys.readouterr().out
+    assert pattern.search("ok1") is not None
+    assert pattern.search("Cookie") is not None
+
+def test_inline_flags_that_break_the_merged_pattern_are_skipped(capsys):
+    pattern = compile_rules(["re:(?i)foo", "bar"], "A")
+    assert "Rule skipped" in capsys.readouterr().out
+    assert pattern.search("bar") is not None
+
+def test_invalid_sheet_rule_only_affects_its_alarm(capsys):
+    engine = load_rule_engine(path="", alarm_options={
+        "A": {"noise_rules": "re:price (;special offer"},
+        "B": {"noise_rules": "re:price \\("},
+    })
+    a = engine.for_alarm("A")
+    b = engine.for_alarm("B")
+    assert "Rule skipped for A" in capsys.readouterr().out
+    assert a.is_noise("Special offer today") is True
+    assert a.is_noise("price (1)") is False
+    assert b.is_noise("price (1)") is True
+
+def test_global_rules_still_apply():
+    engine = RuleEngine(block_rules=["forbidden"], noise_rules=[])
+    engine.set_alarm_rules("A", block=["re:[unclosed"])
+    assert engine.for_alarm("A").blocked_by("403 Forbidden") == "Forbidden"